@@ -0,0 +1,41 @@
+'''
+Compare encode_path()/decode_path() against the previous implementation (which compiled a new regex on every call).
+
+Run from the project root:
+    python -m benchmarks.codec
+'''
+import re
+from timeit import timeit
+
+from django_tree_view.utils import _PATH_REPLACEMENTS, path_codec
+
+def legacy_replace(string, substitutions, reverse=False):
+    if reverse :
+        return legacy_replace(string, dict(
+            (v,k) for k, v in substitutions.items()
+        ))
+    substrings = sorted(substitutions, key=len, reverse=True)
+    regex = re.compile('|'.join(map(re.escape, substrings)))
+    return regex.sub(lambda match: substitutions[match.group(0)], string)
+
+PATHS = [f'/some_path/to/item_{i}/detail/' for i in range(1000)]
+
+def main(number=20):
+    encoded = list(path_codec.encode_many(PATHS))
+    cases = [
+        ('encode', lambda: [legacy_replace(p, _PATH_REPLACEMENTS) for p in PATHS], lambda: list(path_codec.encode_many(PATHS))),
+        ('decode', lambda: [legacy_replace(p, _PATH_REPLACEMENTS, reverse=True) for p in encoded], lambda: list(path_codec.decode_many(encoded))),
+        ('strict decode', None, lambda: list(path_codec.decode_many(encoded, strict=True))),
+    ]
+    results = {}
+    for name, before, after in cases :
+        results[name] = dict(
+            before=before and timeit(before, number=number) / (number * len(PATHS)) * 1e6,
+            after=timeit(after, number=number) / (number * len(PATHS)) * 1e6,
+        )
+        before_text = f'{results[name]["before"]:6.2f} us' if before else '     -   '
+        print(f'{name:<15}before {before_text}    after {results[name]["after"]:6.2f} us')
+    return results
+
+if __name__ == '__main__':
+    main()
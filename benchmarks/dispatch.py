@@ -0,0 +1,83 @@
+'''
+Measure view() dispatch overhead, against the pre-NodeDispatch implementation (which probed the module with getattr on every request).
+
+Run from the project root:
+    python -m benchmarks.dispatch
+'''
+import os
+from timeit import timeit
+
+import django
+from django import http
+import django_referer_csrf
+
+from django_tree_view.node_dispatch import http_method_names
+
+def allowed_methods(handler_module):
+    methods = [m for m in http_method_names if hasattr(handler_module, m)]
+    if 'options' not in methods :
+        methods.append('options')
+    return methods
+
+def legacy_view(request, *handlers):
+    '''view() and preprocess(), as they were before per-node dispatch metadata was added'''
+    method = request.method.lower()
+    handler_node = handlers[-1][0]
+    handler_module = handler_node.module
+    if not getattr(handler_module, 'CSRF_EXEMPT', False) :
+        if not django_referer_csrf.is_valid(request) :
+            return http.HttpResponseForbidden('CSRF check failed.')
+    if method not in http_method_names :
+        return http.HttpResponseNotAllowed(allowed_methods(handler_module))
+    try :
+        handler_func = getattr(handler_module, method)
+    except AttributeError :
+        if method == 'head' and hasattr(handler_module, 'get') :
+            handler_func = handler_module.get
+        elif method == 'options' :
+            response = http.HttpResponse()
+            response['Allow'] = ', '.join(allowed_methods(handler_module))
+            response['Content-Length'] = '0'
+            return response
+        else :
+            return http.HttpResponseNotAllowed(allowed_methods(handler_module))
+    request.view_tree_dir = os.path.join(handler_node.view_tree_path, '')
+    request.view_tree_path = handler_node.view_tree_path
+    branch_data = {}
+    for node, arg in handlers :
+        try :
+            p = getattr(node.module, 'preprocess')
+        except AttributeError :
+            continue
+        args = [arg] if arg is not None else []
+        r = p(request, *args, **branch_data)
+        if r :
+            branch_data.update(r)
+    return handler_func(request, **branch_data)
+
+def main(number=20000):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dummy_project.settings')
+    django.setup()
+    from django.test import RequestFactory
+    from django_tree_view.path_resolver import PathResolver
+    from django_tree_view.view import view
+
+    resolver = PathResolver('tests.view_tree')
+    factory = RequestFactory()
+    cases = [
+        ('get', factory.get('/books/67/'), resolver.get_handler_list('books/67/')),
+        ('head', factory.head('/books/67/'), resolver.get_handler_list('books/67/')),
+        ('options', factory.options('/books/67/'), resolver.get_handler_list('books/67/')),
+        ('405', factory.get('/books/'), resolver.get_handler_list('books/')),
+    ]
+    results = {}
+    for name, request, handlers in cases :
+        results[name] = {}
+        for label, view_func in [('before', legacy_view), ('after', view)] :
+            seconds = timeit(lambda: view_func(request, *handlers), number=number)
+            results[name][label] = seconds / number * 1e6
+        print(f'{name:<10}before {results[name]["before"]:7.2f} us    after {results[name]["after"]:7.2f} us')
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+'''
+Compare the compiled PathResolver against the uncompiled tree walk.
+
+Run from the project root:
+    python -m benchmarks.resolver [root_module_name]
+'''
+import os
+import sys
+from timeit import timeit
+
+import django
+
+from django_tree_view.path_resolver import PathResolver
+
+PATHS = [
+    'foo/',
+    'books/67/',
+    'books/67/raise_early_return/',
+    'multi_capture/banana/',
+    'dates/2020-02-01/',
+    'path_capture/banana/pancake',
+    'does_not_exist/',
+    'books/1a/',
+]
+
+def resolve_all(get_handler_list, paths):
+    for path in paths :
+        try :
+            get_handler_list(path)
+        except PathResolver.NoMatch :
+            pass
+
+def main(root_module_name='tests.view_tree', paths=PATHS, number=20000):
+    # Note - view_tree_node.py modules may import models, so django must be set up first
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dummy_project.settings')
+    django.setup()
+    compiled = PathResolver(root_module_name)
+    uncompiled = PathResolver(root_module_name, compiled=False)
+    results = {}
+    for name, resolver in [('uncompiled', uncompiled), ('compiled', compiled)] :
+        seconds = timeit(lambda: resolve_all(resolver.get_handler_list, paths), number=number)
+        results[name] = seconds / (number * len(paths)) * 1e6
+        print(f'{name:<12}{results[name]:8.2f} us/path')
+    print(f'speedup     {results["uncompiled"] / results["compiled"]:8.2f}x')
+    return results
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
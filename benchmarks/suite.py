@@ -0,0 +1,188 @@
+'''
+Measure how startup and resolution scale, against a synthetic view tree (see synthetic.py).
+
+Run from the project root:
+    python -m benchmarks.suite [--width 4] [--depth 3] [--captures int__,date__,string__,path__] [--output results.json] [--compare baseline.json]
+
+Results are printed (or written to --output) as JSON, as a flat {name: value} dict, where each name ends in its unit.
+Pass --compare with the output of a previous run (ie. against another version) to print the ratio of each result.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from timeit import repeat
+
+import django
+
+from .synthetic import CAPTURE_KINDS, write_tree
+
+PACKAGE_NAME = 'synthetic_view_tree'
+URLCONF_NAME = 'synthetic_view_tree_urls'
+
+def purge_modules(package_name):
+    for name in list(sys.modules) :
+        if name == package_name or name.startswith(package_name + '.') :
+            del sys.modules[name]
+
+def best(func, number, repeats=5):
+    '''Seconds per call, best of repeats'''
+    return min(repeat(func, number=number, repeat=repeats)) / number
+
+def bench_build(results, number):
+    from django_tree_view.path_resolver import PathResolver
+    from django_tree_view.view_tree import ViewTree
+
+    def cold(func):
+        def run():
+            # Re-import every module each time, as a fresh process would
+            purge_modules(PACKAGE_NAME)
+            func()
+        return run
+    results['build.view_tree_ms'] = best(cold(lambda: ViewTree(PACKAGE_NAME)), number) * 1e3
+    results['build.view_tree_lazy_ms'] = best(cold(lambda: ViewTree(PACKAGE_NAME, lazy=True)), number) * 1e3
+    results['build.path_resolver_ms'] = best(cold(lambda: PathResolver(PACKAGE_NAME)), number) * 1e3
+
+def bench_resolve(results, hits, misses, number):
+    from django_tree_view.path_resolver import PathResolver
+
+    for name, compiled in [('compiled', True), ('uncompiled', False)] :
+        get_handler_list = PathResolver(PACKAGE_NAME, compiled=compiled).get_handler_list
+        NoMatch = PathResolver.NoMatch
+
+        # Sanity check the generator, so that we never time the wrong thing
+        for path in hits :
+            get_handler_list(path)
+        for path in misses :
+            try :
+                get_handler_list(path)
+            except NoMatch :
+                continue
+            raise AssertionError(f'{path!r} should not resolve')
+
+        def resolve_hits():
+            for path in hits :
+                get_handler_list(path)
+        def resolve_misses():
+            for path in misses :
+                try :
+                    get_handler_list(path)
+                except NoMatch :
+                    pass
+        results[f'resolve.{name}.hit_us'] = best(resolve_hits, number) / len(hits) * 1e6
+        if misses :
+            results[f'resolve.{name}.miss_us'] = best(resolve_misses, number) / len(misses) * 1e6
+
+def bench_dispatch(results, hits, misses, number, directory):
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import clear_url_caches
+
+    with open(os.path.join(directory, f'{URLCONF_NAME}.py'), 'w') as f :
+        f.write(f'from django_tree_view import make_tree_view\nurlpatterns = [make_tree_view({PACKAGE_NAME!r})]\n')
+    setup_test_environment()
+    settings.DEBUG = False
+    settings.ROOT_URLCONF = URLCONF_NAME
+    clear_url_caches()
+
+    client = Client()
+    hit_urls = ['/' + path for path in hits]
+    miss_urls = ['/' + path for path in misses]
+    for url in hit_urls :
+        response = client.get(url)
+        if response.status_code != 200 :
+            raise AssertionError(f'{url!r} returned {response.status_code}')
+
+    def get_all(urls):
+        for url in urls :
+            client.get(url)
+    results['dispatch.hit_us'] = best(lambda: get_all(hit_urls), number) / len(hit_urls) * 1e6
+    if miss_urls :
+        results['dispatch.miss_us'] = best(lambda: get_all(miss_urls), number) / len(miss_urls) * 1e6
+
+def run(width, depth, captures, seed=0, paths=200, build_number=3, resolve_number=200, dispatch_number=5):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dummy_project.settings')
+    django.setup()
+
+    directory = tempfile.mkdtemp()
+    sys.path.insert(0, directory)
+    try :
+        tree = write_tree(directory, PACKAGE_NAME, width, depth, captures, seed)
+        hits = tree.hits(paths)
+        misses = tree.misses(paths)
+
+        results = {}
+        bench_build(results, build_number)
+        bench_resolve(results, hits, misses, resolve_number)
+        bench_dispatch(results, hits, misses, dispatch_number, directory)
+    finally :
+        sys.path.remove(directory)
+        shutil.rmtree(directory)
+
+    return dict(
+        meta=dict(
+            width=width,
+            depth=depth,
+            captures=list(captures),
+            seed=seed,
+            nodes=tree.node_count,
+            paths=paths,
+            version=_version(),
+            python=platform.python_version(),
+            django=django.get_version(),
+        ),
+        results=results,
+    )
+
+def compare(baseline, current):
+    '''Return {name: current/baseline} for results in both (ie. > 1 means slower, for times)'''
+    return {
+        name: value / baseline['results'][name]
+        for name, value in current['results'].items()
+        if baseline['results'].get(name)
+    }
+
+def _version():
+    import django_tree_view
+    try :
+        with open(os.path.join(os.path.dirname(django_tree_view.__file__), 'VERSION')) as f :
+            return f.read().strip()
+    except OSError :
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=4, help='static children per node')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--captures', default=','.join(CAPTURE_KINDS), help='comma separated capture kinds to add below each node')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--paths', type=int, default=200, help='number of hit (and miss) paths to time')
+    parser.add_argument('--output', help='write results to this file, rather than stdout')
+    parser.add_argument('--compare', help='results of a previous run, to compare against')
+    args = parser.parse_args(argv)
+
+    captures = [c for c in args.captures.split(',') if c]
+    data = run(args.width, args.depth, captures, args.seed, args.paths)
+
+    text = json.dumps(data, indent=2)
+    if args.output :
+        with open(args.output, 'w') as f :
+            f.write(text + '\n')
+    else :
+        print(text)
+
+    if args.compare :
+        with open(args.compare) as f :
+            baseline = json.load(f)
+        if baseline['meta'] != {**data['meta'], 'version': baseline['meta']['version'], 'python': baseline['meta']['python'], 'django': baseline['meta']['django']} :
+            print('Warning: the baseline was run with different tree parameters', file=sys.stderr)
+        for name, ratio in compare(baseline, data).items() :
+            print(f'{name:<35}{baseline["results"][name]:10.3f} -> {data["results"][name]:10.3f}  ({ratio:.2f}x)', file=sys.stderr)
+    return data
+
+if __name__ == '__main__':
+    main()
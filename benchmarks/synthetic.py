@@ -0,0 +1,122 @@
+'''
+Generate synthetic view trees, for benchmarking how resolution and startup scale.
+
+Every node has width static children ("n0", "n1", ...), plus one child for each capture kind in captures, down to depth levels.
+path__ nodes are always leaves (they consume the rest of the path).
+Every node has a view_tree_node.py with a get() handler, and a preprocess() which passes along its captured arg.
+
+Usage:
+    tree = write_tree(directory, 'synthetic_view_tree', width=4, depth=3)
+    tree.hits(100) # -> urls which resolve
+    tree.misses(100) # -> urls which don't
+'''
+import os
+import random
+
+CAPTURE_KINDS = ('int__', 'date__', 'string__', 'path__')
+
+NODE_MODULE = '''\
+from django import http
+
+def preprocess(request, *args, **kwargs):
+    return dict(depth_{depth}=args[0] if args else None)
+
+def get(request, **kwargs):
+    return http.HttpResponse(str(len(kwargs)))
+'''
+
+class SyntheticTree:
+    def __init__(self, package_name, width, depth, captures, seed):
+        self.package_name = package_name
+        self.width = width
+        self.depth = depth
+        self.captures = captures
+        self.seed = seed
+        self.node_count = 0
+
+    def children(self, level):
+        if level >= self.depth :
+            return []
+        return [f'n{i}' for i in range(self.width)] + list(self.captures)
+
+    def hits(self, count):
+        '''Return count random urls (relative, without a leading '/') which resolve'''
+        rand = random.Random(self.seed)
+        return [self._random_path(rand) for i in range(count)]
+
+    def misses(self, count):
+        '''
+            Return count random urls which don't resolve.
+            Half fail at the leaf (an extra segment below a leaf node), and half fail at the first segment (unless captures include string__ or path__, which match any first segment).
+        '''
+        if not self.width and set(self.captures) <= {'path__'} :
+            # The root's path__ node matches everything
+            return []
+        rand = random.Random(self.seed + 1)
+        paths = []
+        for i in range(count) :
+            if i % 2 or 'string__' in self.captures or 'path__' in self.captures :
+                path = self._random_path(rand, leaf=True)
+                paths.append(path + 'missing/')
+            else :
+                paths.append(f'missing{i}/')
+        return paths
+
+    def _random_path(self, rand, leaf=False):
+        '''If leaf, always descend to depth, and never through path__ (which would capture any extra segment)'''
+        segments = []
+        level = 0
+        while True :
+            children = self.children(level)
+            if leaf :
+                children = [c for c in children if c != 'path__']
+            if not children or (not leaf and rand.random() < 0.2) :
+                break
+            child = rand.choice(children)
+            if child == 'path__' :
+                # Note - string__ would capture any segment followed by '/' (we don't backtrack), so only the final segment is left for path__
+                segments.append(f'p{rand.randrange(1000)}' if 'string__' in self.captures else f'p{rand.randrange(1000)}/x/y')
+                return '/'.join(segments)
+            segments.append(_segment(child, rand))
+            level += 1
+        return ''.join(s + '/' for s in segments)
+
+def _segment(child, rand):
+    if child == 'int__' :
+        return str(rand.randrange(100000))
+    if child == 'date__' :
+        return f'20{rand.randrange(10, 30)}-0{rand.randrange(1, 10)}-1{rand.randrange(0, 10)}'
+    if child == 'string__' :
+        return f's{rand.randrange(100000)}'
+    return child
+
+def write_tree(directory, package_name, width=4, depth=3, captures=CAPTURE_KINDS, seed=0):
+    '''
+        Write a view tree package named package_name into directory (which should be on sys.path).
+        Returns a SyntheticTree, describing the tree.
+    '''
+    captures = tuple(captures)
+    for capture in captures :
+        if capture not in CAPTURE_KINDS :
+            raise ValueError(f'Unknown capture kind: {capture!r}')
+    tree = SyntheticTree(package_name, width, depth, captures, seed)
+    root = os.path.join(directory, package_name)
+    os.makedirs(root)
+    with open(os.path.join(root, '__init__.py'), 'w') :
+        pass
+    _write_node(tree, root, 0)
+    return tree
+
+def _write_node(tree, directory, level):
+    tree.node_count += 1
+    with open(os.path.join(directory, 'view_tree_node.py'), 'w') as f :
+        f.write(NODE_MODULE.format(depth=level))
+    for child in tree.children(level) :
+        child_directory = os.path.join(directory, child)
+        os.mkdir(child_directory)
+        if child == 'path__' :
+            tree.node_count += 1
+            with open(os.path.join(child_directory, 'view_tree_node.py'), 'w') as f :
+                f.write(NODE_MODULE.format(depth=level+1))
+        else :
+            _write_node(tree, child_directory, level+1)
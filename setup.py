@@ -15,7 +15,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/quadrant-newmedia/django_tree_view",
-    packages=["django_tree_view"],
+    packages=setuptools.find_packages("src"),
     package_dir={"": "src"},
     include_package_data=True,
     classifiers=[
@@ -25,7 +25,7 @@ setuptools.setup(
     ],
     python_requires=">=3.7",
     install_requires=[
-        "Django>=3.0,<6",
+        "Django>=4.2,<6",
         "django-dynamic-path<1",
         "django_referer_csrf<1",
         "django_early_return<1",
@@ -3,19 +3,53 @@ from django.urls.exceptions import Resolver404
 from django_dynamic_path import DynamicPath
 from django_early_return import EarlyReturn
 
-from .path_resolver import PathResolver
-from .view import view, preprocess
+from .path_resolver import PathResolver, MergedPathResolver
+from .urlconf import iter_path_resolvers
+from .view import view, async_view as _async_view, preprocess, bulk_test_page_visibility
 
-def make_tree_view(root_module_name="view_tree"):
+def make_tree_view(root_module_name="view_tree", async_view=False, **resolver_options):
     '''
         Return an object suitable for use in django's urlpatterns.
 
         root_module_name should be the dotted python path to a python package containing your "view tree"
+
+        If async_view is True, the tree view is an async view, which awaits async preprocess() and handler functions directly (use this under ASGI).
+
+        Any resolver_options (ie. compiled=False, cache_size=5000, lazy=True, manifest=True) are passed on to PathResolver
     '''
     return DynamicPath(
-        PathResolver(root_module_name),
-        view,
+        PathResolver(root_module_name, **resolver_options),
+        _async_view if async_view else view,
     )
 
+def make_merged_tree_view(roots, async_view=False, **resolver_options):
+    '''
+        Like make_tree_view(), but for several view trees, which are merged so that every path is resolved in a single walk (see MergedTree).
+
+        roots is a list of root module names, or (prefix, root_module_name) tuples, ie. ['main_view_tree', ('api/', 'api_view_tree')]
+
+        Raises ConfigurationError if the trees define conflicting urls.
+        resolver_options (ie. cache_size=5000, lazy=True, manifest=True) are passed on to MergedPathResolver
+    '''
+    return DynamicPath(
+        MergedPathResolver(roots, **resolver_options),
+        _async_view if async_view else view,
+    )
+
+def warm_tree_views(urlconf=None):
+    '''
+        Import every module of every tree view in urlconf (default: settings.ROOT_URLCONF).
+
+        Use this with make_tree_view(lazy=True) if you'd rather pay the import cost up front, ie. in wsgi.py before your server forks worker processes.
+    '''
+    for resolver in iter_path_resolvers(urlconf) :
+        resolver.warm()
+
 # For external use:
-from .utils import encode_path, decode_path
+from .utils import encode_path, decode_path, path_codec, PathCodec
+from .converters import Converter, register_converter, unregister_converter
+from .reverse import tree_url
+from .templates import render_node_template, stream_node_template
+from .routes import iter_routes, iter_urls, iter_url_batches
+from .response_cache import invalidate_tree_cache
+from .timing import add_timing_observer, remove_timing_observer, enable_server_timing, TimingHistograms
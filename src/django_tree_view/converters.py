@@ -0,0 +1,172 @@
+'''
+converters.py
+
+The registry of "capturing" node kinds.
+
+A directory named "<name>__" captures a single path segment, using the converter registered under name.
+Converters are tried in priority order (lowest first), but only those which a given node actually has subtrees for.
+
+Note - path__ is not a converter. It is always tried last, and consumes the entire remaining path.
+'''
+from calendar import monthrange
+from datetime import date
+import re
+import sys
+from urllib.parse import quote
+from uuid import UUID
+
+# Same characters django's reverse() leaves unquoted
+_URL_SAFE = "/~:@!$&'()*+,;="
+
+class Converter:
+    '''
+        Base class for converters. Subclasses must set name and regex.
+
+        regex
+            must match the entire segment - it's precompiled, and checked before to_python() is called
+        to_python(value)
+            convert a matching segment to the argument passed to preprocess().
+            May return None to reject the segment (for constraints that are awkward to express in regex), but should not raise.
+        to_url(value)
+            inverse of to_python() - convert an argument back into a url segment
+        priority
+            converters with a lower priority are tried first
+        quote_url
+            set False if to_url() only ever returns characters which are safe in urls (saves quoting them in reverse())
+    '''
+    name = None
+    regex = None
+    priority = 100
+    quote_url = True
+
+    def __init__(self):
+        self.directory_name = self.name + '__'
+        self._fullmatch = re.compile(self.regex).fullmatch
+
+    def match(self, segment):
+        '''Return the converted segment, or None if it doesn't match. Never raises.'''
+        if self._fullmatch(segment) :
+            return self.to_python(segment)
+        return None
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return str(value)
+
+    def reverse(self, value):
+        '''Return to_url(value), quoted for use in a url, or None if the result doesn't match regex (and so would not resolve)'''
+        text = self.to_url(value)
+        if not self._fullmatch(text) :
+            return None
+        return quote(text, safe=_URL_SAFE) if self.quote_url else text
+
+# python >= 3.11 refuses to convert very long digit strings
+_INT_MAX_LENGTH = getattr(sys, 'get_int_max_str_digits', lambda: 0)() or sys.maxsize
+
+class IntConverter(Converter):
+    name = 'int'
+    # Note - this accepts everything int() does (sign, surrounding whitespace, underscores), for backward compatibility
+    regex = r'\s*[+-]?\d+(?:_\d+)*\s*'
+    priority = 10
+    quote_url = False
+
+    def match(self, segment):
+        if len(segment) <= _INT_MAX_LENGTH and self._fullmatch(segment) :
+            return int(segment)
+        return None
+
+    def to_python(self, value):
+        return int(value)
+
+class DateConverter(Converter):
+    '''
+        Note - only the YYYY-MM-DD form is matched.
+        date.fromisoformat() accepts other forms on python >= 3.11 (ie. 20200201), but we don't want multiple urls for the same date.
+    '''
+    name = 'date'
+    regex = r'([0-9]{4})-([0-9]{2})-([0-9]{2})'
+    priority = 20
+    quote_url = False
+
+    def match(self, segment):
+        m = self._fullmatch(segment)
+        if not m :
+            return None
+        year, month, day = int(m[1]), int(m[2]), int(m[3])
+        if year < 1 or not 1 <= month <= 12 or not 1 <= day <= monthrange(year, month)[1] :
+            return None
+        return date(year, month, day)
+
+    def to_python(self, value):
+        return self.match(value)
+
+    def to_url(self, value):
+        return value.isoformat()
+
+class UUIDConverter(Converter):
+    name = 'uuid'
+    regex = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+    priority = 30
+    quote_url = False
+
+    def to_python(self, value):
+        return UUID(value)
+
+class SlugConverter(Converter):
+    name = 'slug'
+    regex = r'[-a-zA-Z0-9_]+'
+    priority = 40
+    quote_url = False
+
+class StringConverter(Converter):
+    name = 'string'
+    # Note - any segment matches, but we can't reverse a value containing '/'
+    regex = r'[^/]*'
+    priority = 1000
+
+    def match(self, segment):
+        # Matches anything - no need to run the regex
+        return segment
+
+class PathConverter(Converter):
+    '''
+        Used for reversing path__ nodes only - it's never registered (see module docstring).
+    '''
+    name = 'path'
+    regex = r'(?s).+'
+
+_converters = {}
+_ordered = ()
+
+def register_converter(converter):
+    '''
+        Register a Converter instance (replacing any existing converter with the same name).
+
+        Like django.urls.register_converter(), this should be called before your urlconf is loaded (view trees are compiled when they're loaded).
+    '''
+    global _ordered
+    if not converter.name or converter.name.endswith('_') :
+        raise ValueError(f'Invalid converter name: {converter.name!r}')
+    _converters[converter.name] = converter
+    _ordered = tuple(sorted(_converters.values(), key=lambda c: c.priority))
+
+def unregister_converter(name):
+    '''Remove the converter registered under name (view trees which are already loaded keep using it)'''
+    global _ordered
+    del _converters[name]
+    _ordered = tuple(sorted(_converters.values(), key=lambda c: c.priority))
+
+def get_converters():
+    '''Return all registered converters, in priority order'''
+    return _ordered
+
+def get_converter(directory_name):
+    '''Return the converter for a capturing directory name (ie. "int__"), or None'''
+    if not directory_name.endswith('__') :
+        return None
+    return _converters.get(directory_name[:-2])
+
+for converter in (IntConverter(), DateConverter(), UUIDConverter(), SlugConverter(), StringConverter()) :
+    register_converter(converter)
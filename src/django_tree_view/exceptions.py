@@ -0,0 +1,8 @@
+'''
+exceptions.py
+
+ConfigurationError -> raised for invalid view trees (and view_tree_node.py settings). Also available from view_tree.py.
+'''
+
+class ConfigurationError(Exception):
+    pass
@@ -0,0 +1,173 @@
+'''
+loading.py
+
+Declarative model loading for capturing nodes -> the captured arg is replaced by a model instance, and instances for a whole url are loaded in as few queries as possible.
+
+A capturing node's view_tree_node.py may declare (NodeDispatch raises ConfigurationError for non-capturing nodes):
+    LOAD = dict(
+        model=Project,      # a model class, or 'app_label.ModelName'
+        field='pk',         # the field the captured arg is looked up by (default 'pk')
+        name='project',     # the branch data name to store the instance as (default: the model name, in lower case)
+        parent='org',       # optional - a ForeignKey of model, which must point to the instance an ancestor node loaded under the same name
+    )
+
+The instance is added to the branch data before the node's own preprocess() runs (which still receives the captured arg, too).
+If there's no such instance (or it doesn't belong to its parent), Http404 is raised at that node, so ancestors' preprocess() (ie. permission checks) run first.
+
+Batching:
+    Before preprocessing, we look for chains of LOAD nodes linked by parent (ie. org -> project -> task), and load each chain with a single select_related() query, filtered on every captured arg.
+    The query also enforces the parent relationships.
+    If it doesn't find anything, we fall back to loading each node's instance separately (when preprocess() reaches that node), so that 404s are raised at the same point either way.
+'''
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+_OPTIONS = {'model', 'field', 'name', 'parent'}
+
+class ModelLoad:
+    __slots__ = ('model', 'field', 'name', 'parent')
+
+    def __init__(self, options):
+        unknown = set(options) - _OPTIONS
+        if unknown :
+            raise ValueError(f'Unknown LOAD options: {", ".join(sorted(unknown))}')
+        model = options['model']
+        self.model = apps.get_model(model) if isinstance(model, str) else model
+        self.field = options.get('field', 'pk')
+        self.name = options.get('name', self.model._meta.model_name)
+        self.parent = options.get('parent')
+
+    def key(self, arg, branch_data):
+        '''Identifies the instance within a request (the same arg may refer to different instances, under different parents)'''
+        if self.parent is None :
+            return (self, arg, None)
+        return (self, arg, branch_data[self.parent].pk)
+
+    def load(self, request, arg, branch_data):
+        '''Return the instance for arg, from the request's LoadedObjects if possible. Raises Http404.'''
+        loaded = LoadedObjects.for_request(request)
+        key = self.key(arg, branch_data)
+        instance = loaded.objects.get(key)
+        if instance is None :
+            filters = {self.field: arg}
+            if self.parent is not None :
+                filters[self.parent] = branch_data[self.parent]
+            instance = _first(self.model, filters)
+            if instance is None :
+                raise Http404(f'No {self.model._meta.verbose_name} matches {arg!r}')
+            loaded.objects[key] = instance
+            loaded.queries += 1
+        return instance
+
+class LoadedObjects:
+    '''
+        Request-scoped instances loaded for LOAD nodes.
+
+        self.queries
+            number of queries run (batched and individual)
+    '''
+    REQUEST_ATTRIBUTE = '_tree_view_loaded_objects'
+
+    def __init__(self):
+        self.objects = {}
+        self.queries = 0
+
+    @classmethod
+    def for_request(cls, request):
+        try :
+            return getattr(request, cls.REQUEST_ATTRIBUTE)
+        except AttributeError :
+            loaded = cls()
+            setattr(request, cls.REQUEST_ATTRIBUTE, loaded)
+            return loaded
+
+def with_model_load(preprocess, load, is_async):
+    '''Return a preprocess() function which loads the instance for the captured arg, then calls preprocess (which may be None)'''
+    if is_async :
+        async def preprocess_with_load(request, arg, **branch_data):
+            instance = await sync_to_async(load.load)(request, arg, branch_data)
+            return _merge(load, instance, await preprocess(request, arg, **branch_data, **{load.name: instance}))
+    else :
+        def preprocess_with_load(request, arg, **branch_data):
+            instance = load.load(request, arg, branch_data)
+            r = preprocess(request, arg, **branch_data, **{load.name: instance}) if preprocess is not None else None
+            return _merge(load, instance, r)
+    return preprocess_with_load
+
+def _merge(load, instance, r):
+    result = {load.name: instance}
+    if r :
+        result.update(r)
+    return result
+
+def has_chains(handlers):
+    '''True if prefetch() could batch anything for handlers (cheap)'''
+    return any(node.dispatch.load is not None and node.dispatch.load.parent is not None for node, arg in handlers)
+
+def prefetch(request, handlers):
+    '''
+        Load every chain (of 2 or more LOAD nodes linked by parent) in handlers with a single query, into LoadedObjects.for_request(request).
+    '''
+    if not has_chains(handlers) :
+        return
+    loads = [(node.dispatch.load, arg) for node, arg in handlers if node.dispatch.load is not None]
+
+    # Link each load to the nearest preceding load of its parent
+    parents = {}
+    referenced = set()
+    for i, (load, arg) in enumerate(loads) :
+        if load.parent is None :
+            continue
+        for j in range(i-1, -1, -1) :
+            if loads[j][0].name == load.parent :
+                parents[i] = j
+                referenced.add(j)
+                break
+
+    loaded = LoadedObjects.for_request(request)
+    for leaf in range(len(loads)) :
+        if leaf in referenced or leaf not in parents :
+            continue
+        chain = [leaf]
+        while chain[-1] in parents :
+            chain.append(parents[chain[-1]])
+        _load_chain(loaded, [loads[i] for i in chain])
+
+def _load_chain(loaded, chain):
+    '''chain is a list of (ModelLoad, arg), from the leaf up'''
+    leaf, leaf_arg = chain[0]
+    filters = {leaf.field: leaf_arg}
+    prefix = ''
+    for (child, child_arg), (load, arg) in zip(chain, chain[1:]) :
+        prefix += child.parent + '__'
+        filters[prefix + load.field] = arg
+    instance = _first(leaf.model, filters, prefix[:-2] or None)
+    loaded.queries += 1
+    if instance is None :
+        return
+
+    instances = [instance]
+    for child, child_arg in chain[:-1] :
+        instances.append(getattr(instances[-1], child.parent))
+    # Store from the root down, so that each key can use its parent's pk
+    parent_instance = None
+    for (load, arg), instance in reversed(list(zip(chain, instances))) :
+        if load.parent is None :
+            loaded.objects[(load, arg, None)] = instance
+        elif parent_instance is not None :
+            loaded.objects[(load, arg, parent_instance.pk)] = instance
+        # else - the top of the chain has a parent we didn't load, so it's checked when preprocess() reaches it
+        parent_instance = instance
+
+def _first(model, filters, related=None):
+    '''Return the first instance of model matching filters, or None - including when an arg isn't valid for its field'''
+    try :
+        # Note - invalid args (ie. 'abc' for an integer pk) raise in filter(), not just when the query runs (ie. out of range ints)
+        queryset = model._default_manager.filter(**filters)
+        if related is not None :
+            queryset = queryset.select_related(related)
+        return queryset.first()
+    except (ValueError, TypeError, OverflowError, ValidationError) :
+        return None
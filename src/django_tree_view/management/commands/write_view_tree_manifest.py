@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_tree_view import iter_path_resolvers
+from django_tree_view.view_tree import ViewTree
+
+class Command(BaseCommand):
+    help = 'Write a manifest of each view tree, so that make_tree_view(manifest=...) can start up without walking the view tree directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('root_module_names', nargs='*', help='Dotted python path(s) of view tree root packages. Defaults to every tree view in ROOT_URLCONF.')
+        parser.add_argument('-o', '--output', help='Manifest file path (only valid with a single root_module_name). Defaults to a file beside the root package.')
+
+    def handle(self, *args, root_module_names, output, **options):
+        if root_module_names :
+            if output and len(root_module_names) > 1 :
+                raise CommandError('--output can only be used with a single root_module_name')
+            targets = [(name, output) for name in root_module_names]
+        else :
+            # Note - manifest=True means "default location"
+            targets = [
+                (resolver.root_module_name, resolver.manifest if resolver.manifest is not True else None)
+                for resolver in iter_path_resolvers()
+            ]
+
+        for root_module_name, manifest_path in targets :
+            written = ViewTree(root_module_name).write_manifest(manifest_path)
+            self.stdout.write(f'Wrote manifest for {root_module_name} to {written}')
@@ -0,0 +1,92 @@
+'''
+manifest.py
+
+Reading and writing view tree manifests -> a JSON snapshot of a ViewTree's structure, so that processes can start without walking the view tree directories.
+
+A manifest looks like:
+    {
+        "format": 1,
+        "root_module_name": "my_view_tree",
+        "tree": <node>,
+    }
+where each <node> is:
+    {
+        "path": view_tree_path,
+        "package": package name,
+        "mtime": directory mtime (ns), when the manifest was written,
+        "module": true if the directory has a view_tree_node.py,
+        "captures": capture kinds (ie. "int__") among the subtrees,
+        "subtrees": {name: <node>, ...},
+    }
+'''
+import json
+import os
+
+from .converters import get_converters
+
+FORMAT = 1
+
+def default_manifest_path(package_path):
+    '''
+        Note - the manifest must not be written inside the view tree, since that would change the mtime of the directory containing it (and the manifest would never be fresh).
+    '''
+    return package_path.parent / f'{package_path.name}.view_tree_manifest.json'
+
+def node_to_manifest(node):
+    return dict(
+        path=node.view_tree_path,
+        package=node.package_name,
+        mtime=node.mtime,
+        module=node.module is not None,
+        captures=[
+            name for name in [c.directory_name for c in get_converters()] + ['path__']
+            if name in node.subtrees
+        ],
+        subtrees={
+            name: node_to_manifest(subtree)
+            for name, subtree in node.subtrees.items()
+        },
+    )
+
+def write_manifest(view_tree, manifest_path):
+    data = dict(
+        format=FORMAT,
+        root_module_name=view_tree.package_name,
+        tree=node_to_manifest(view_tree),
+    )
+    # Write to a temporary file and rename, so that other processes never read a partial manifest
+    temp_path = f'{manifest_path}.tmp'
+    with open(temp_path, 'w') as f :
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_path, manifest_path)
+
+def read_fresh_manifest(manifest_path, root_module_name, package_path):
+    '''
+        Return the "tree" of the manifest at manifest_path, if it exists, belongs to root_module_name, and is fresh.
+        Return None otherwise.
+
+        The manifest is fresh if the mtime of every directory in it is unchanged.
+        Adding or removing a subdirectory or a view_tree_node.py module changes the mtime of the containing directory, so this requires just one stat() per directory.
+    '''
+    try :
+        with open(manifest_path) as f :
+            data = json.load(f)
+    except (OSError, ValueError) :
+        return None
+    if data.get('format') != FORMAT or data.get('root_module_name') != root_module_name :
+        return None
+    tree = data['tree']
+    if not _is_fresh(tree, os.fspath(package_path)) :
+        return None
+    return tree
+
+def _is_fresh(entry, directory):
+    try :
+        if os.stat(directory).st_mtime_ns != entry['mtime'] :
+            return False
+    except OSError :
+        return False
+    return all(
+        _is_fresh(subtree, os.path.join(directory, name))
+        for name, subtree in entry['subtrees'].items()
+    )
@@ -0,0 +1,112 @@
+'''
+node_dispatch.py
+
+Implements NodeDispatch -> everything view() needs to know about a view_tree_node.py module, computed once per node.
+'''
+from inspect import isasyncgenfunction, iscoroutinefunction, isgeneratorfunction
+
+from .exceptions import ConfigurationError
+from .loading import ModelLoad, with_model_load
+from .preload import get_node_links
+from .providers import with_providers
+from .response_cache import CachePolicy
+
+http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options', 'trace']
+
+class NodeDispatch:
+    '''
+        self.handlers
+            maps (lower case) http method name -> handler function
+            'head' falls back to the 'get' handler
+        self.allowed_methods
+            list of methods to report in the Allow header (always includes 'options')
+        self.allow
+            self.allowed_methods, as an Allow header value
+        self.csrf_exempt
+            the module's CSRF_EXEMPT setting
+        self.preprocess
+            the module's preprocess() function, or None
+            If the module declares LOAD or PROVIDERS, a wrapper which also adds the loaded instance (see loading.py) or their lazy values (see providers.py) to the branch data
+        self.load
+            a ModelLoad, from the module's LOAD setting, or None
+        self.needs, self.produces
+            the module's NEEDS and PRODUCES settings, as tuples (see PreprocessPlan)
+            produces is None if the module doesn't declare PRODUCES, so its preprocess() can't run concurrently
+        self.memoize_preprocess
+            the module's MEMOIZE_PREPROCESS setting (default True) - see PreprocessCache
+        self.async_methods
+            set of methods whose handler is a coroutine function (async def)
+        self.preprocess_is_async
+            True if preprocess() is a coroutine function
+        self.is_async
+            True if either of the above apply
+        self.streaming_methods
+            set of methods whose handler's result is wrapped in a StreamingHttpResponse
+            ie. generator and async generator functions, or every handler, if the module sets STREAMING = True
+        self.streaming_content_type
+            the module's STREAMING_CONTENT_TYPE setting, or None (django's default content type)
+        self.cache
+            a CachePolicy, from the module's CACHE setting, or None
+        self.etag, self.last_modified
+            the module's etag() and last_modified() functions (validators for conditional GET/HEAD requests), or None
+        self.conditional
+            True if either of the above is defined
+        self.links
+            list of Link header values for the module's PRELOAD and PRECONNECT hints (see preload.py)
+    '''
+    __slots__ = ('handlers', 'allowed_methods', 'allow', 'csrf_exempt', 'preprocess', 'load', 'needs', 'produces', 'memoize_preprocess', 'async_methods', 'preprocess_is_async', 'is_async', 'streaming_methods', 'streaming_content_type', 'cache', 'etag', 'last_modified', 'conditional', 'links')
+
+    def __init__(self, module, captures=False):
+        '''
+            module may be None, for nodes without a view_tree_node.py
+            captures is True for nodes which capture an arg from the url (int__, path__, etc.)
+        '''
+        self.handlers = {
+            method: getattr(module, method)
+            for method in http_method_names
+            if hasattr(module, method)
+        }
+        if 'head' not in self.handlers and 'get' in self.handlers :
+            self.handlers['head'] = self.handlers['get']
+
+        self.allowed_methods = [m for m in http_method_names if hasattr(module, m)]
+        if 'options' not in self.allowed_methods :
+            self.allowed_methods.append('options')
+        self.allow = ', '.join(self.allowed_methods)
+
+        self.csrf_exempt = getattr(module, 'CSRF_EXEMPT', False)
+        # Modules don't have to implement preprocess()
+        self.preprocess = getattr(module, 'preprocess', None)
+        self.memoize_preprocess = getattr(module, 'MEMOIZE_PREPROCESS', True)
+        self.needs = tuple(getattr(module, 'NEEDS', ()))
+        produces = getattr(module, 'PRODUCES', None)
+        self.produces = tuple(produces) if produces is not None else None
+        load = getattr(module, 'LOAD', None)
+        self.load = ModelLoad(load) if load is not None else None
+        if self.load is not None and not captures :
+            raise ConfigurationError(f'{module.__name__} declares LOAD, but its node does not capture an arg')
+        if self.load is not None :
+            self.preprocess = with_model_load(self.preprocess, self.load, iscoroutinefunction(self.preprocess))
+        providers = getattr(module, 'PROVIDERS', None)
+        if providers :
+            self.preprocess = with_providers(self.preprocess, providers, iscoroutinefunction(self.preprocess))
+
+        self.async_methods = frozenset(m for m, f in self.handlers.items() if iscoroutinefunction(f))
+        self.preprocess_is_async = iscoroutinefunction(self.preprocess)
+        self.is_async = self.preprocess_is_async or bool(self.async_methods)
+
+        streaming = getattr(module, 'STREAMING', False)
+        self.streaming_methods = frozenset(
+            m for m, f in self.handlers.items()
+            if streaming or isgeneratorfunction(f) or isasyncgenfunction(f)
+        )
+        self.streaming_content_type = getattr(module, 'STREAMING_CONTENT_TYPE', None)
+
+        cache = getattr(module, 'CACHE', None)
+        self.cache = CachePolicy(cache) if cache is not None else None
+
+        self.etag = getattr(module, 'etag', None)
+        self.last_modified = getattr(module, 'last_modified', None)
+        self.conditional = self.etag is not None or self.last_modified is not None
+
+        self.links = get_node_links(module)
@@ -1,40 +1,156 @@
-from datetime import date
+from time import perf_counter
 
 from django.conf import settings
 
-from .view_tree import ViewTree
+from . import timing
+from .converters import get_converters
+from .preload import clear_link_headers
+from .preprocess_graph import PreprocessPlan
+from .reverse import build_url_templates
+from .resolver_cache import ResolverCache
+from .view_tree import ViewTree, ConfigurationError
 
 
 class PathResolver:
     class NoMatch(Exception):
         pass
 
-    def __init__(self, root_module_name):
+    def __init__(self, root_module_name, compiled=True, cache_size=None, negative_cache_size=None, cache_eviction='lru', lazy=False, manifest=None):
+        '''
+            If compiled is True (the default), the view tree is compiled into a CompiledTree after every (re)load, and paths are resolved against that.
+            Set compiled=False to walk ViewTreeNode.subtrees directly on every request (the original behaviour).
+
+            cache_size enables a ResolverCache of resolved handler lists, keyed by path.
+            negative_cache_size enables a second ResolverCache, of paths which did not resolve. It is ignored when settings.DEBUG, so that newly added modules are still picked up.
+            cache_eviction ('lru' or 'fifo') applies to both.
+            Both caches are cleared whenever the view tree is reloaded or refreshed.
+
+            If lazy is True, the directory structure is still scanned up front, but each view_tree_node.py module is only imported when a request first resolves through it. Call warm() to import them all.
+
+            manifest (a path, or True for the default location) loads the tree structure from a manifest written by the write_view_tree_manifest management command, if it's fresh (see ViewTree).
+        '''
         self.root_module_name = root_module_name
-        self.view_tree = ViewTree(root_module_name)
+        self.compiled = compiled
+        self.lazy = lazy
+        self.manifest = manifest
+        self.cache = ResolverCache(cache_size, cache_eviction) if cache_size else None
+        self.negative_cache = ResolverCache(negative_cache_size, cache_eviction) if negative_cache_size else None
+        self.resolved = self.unresolved = self.rejected = 0
+        self.load_view_tree()
+
+    def load_view_tree(self):
+        '''(Re)build the entire view tree, importing every module'''
+        self.view_tree = ViewTree(self.root_module_name, self.lazy, self.manifest)
+        self._view_tree_changed()
+
+    def warm(self):
+        '''Import every module in the view tree now, rather than on first use'''
+        self.view_tree.warm()
+
+    def refresh_view_tree(self):
+        '''Rescan only those directories which have changed (see ViewTreeNode.refresh()). Returns True if anything changed.'''
+        changed = self.view_tree.refresh()
+        if changed :
+            self._view_tree_changed()
+        return changed
+
+    def _view_tree_changed(self):
+        self.compiled_tree = CompiledTree(self.view_tree) if self.compiled else None
+        self.first_segments = FirstSegmentIndex.from_subtrees(self.view_tree.subtrees, self.view_tree.module is not None)
+        # See reverse.tree_url()
+        self.url_templates = build_url_templates(self.view_tree)
+        if self.cache is not None :
+            self.cache.clear()
+        if self.negative_cache is not None :
+            self.negative_cache.clear()
+        # Per branch caches, keyed by node -> a branch's entry depends on every node in it, so any change may invalidate it.
+        # They're shared by every view tree, so we clear them entirely, which also lets replaced nodes be freed.
+        clear_link_headers()
+        PreprocessPlan.clear_cache()
+
+    def cache_info(self):
+        return dict(
+            # Note - ResolverCache defines __len__, so an empty cache is falsy
+            cache=self.cache.info() if self.cache is not None else None,
+            negative_cache=self.negative_cache.info() if self.negative_cache is not None else None,
+        )
+
+    def resolve_info(self):
+        '''
+            Counters of paths passed to this resolver (approximate, when serving requests from multiple threads):
+                resolved - paths which resolved
+                unresolved - paths which did not resolve
+                rejected - paths which did not resolve, and were rejected by the first segment alone (see FirstSegmentIndex). Not included in unresolved.
+        '''
+        return dict(resolved=self.resolved, unresolved=self.unresolved, rejected=self.rejected)
 
     def __call__(self, path):
-        try:
-            return (self.get_handler_list(path), {})
-        except self.NoMatch:
-            pass
+        if timing.enabled :
+            return self._timed_call(path)
+        return self._call(path)
 
-        if not settings.DEBUG:
-            return
+    def _timed_call(self, path):
+        start = perf_counter()
+        match = self._call(path)
+        seconds = perf_counter() - start
+        timing.record_resolve(match[0][-1][0].view_tree_path if match else None, seconds)
+        return match
 
-        try:
-            """
-                Reload the entire module tree, in case a new module has been added
-                (django's runserver won't auto-reload when adding new modules, since you don't have to update existing files to import them)
+    def _call(self, path):
+        if not self.first_segments.may_match(path) :
+            # Note - adding a top level directory (or the root view_tree_node.py) changes the mtime of the root directory
+            if not (settings.DEBUG and self._root_is_stale() and self.refresh_view_tree()) :
+                self.rejected += 1
+                return None
 
-                Note - this does not catch:
-                    - modules that were deleted (cached, same response is returned)
-                    - directory already existed, you received 404, then you added __init__.py
-            """
-            self.view_tree = ViewTree(self.root_module_name)
-            return (self.get_handler_list(path), {})
+        match = self._resolve(path)
+        if settings.DEBUG :
+            match = self._refresh_and_resolve(path, match)
+
+        if match is None :
+            self.unresolved += 1
+        else :
+            self.resolved += 1
+        return match
+
+    def _refresh_and_resolve(self, path, match):
+        """
+            Bring the view tree up to date with the file system, in case modules have been added or deleted
+            (django's runserver won't auto-reload when adding new modules, since you don't have to update existing files to import them)
+
+            This is cheap unless something actually changed:
+                - if the path resolved, we only stat the matched directories (to catch deleted modules)
+                - otherwise, we stat every directory, but only rescan (and re-import from) those which have changed
+        """
+        if match is None or any(node.is_stale() for node, arg in match[0]) :
+            if self.refresh_view_tree() :
+                return self._resolve(path)
+        return match
+
+    def _root_is_stale(self):
+        return self.view_tree.is_stale()
+
+    def _resolve(self, path):
+        if self.cache is not None :
+            handler_list = self.cache.get(path)
+            if handler_list is not ResolverCache.MISSING :
+                return (handler_list, {})
+        use_negative_cache = self.negative_cache is not None and not settings.DEBUG
+        if use_negative_cache :
+            if self.negative_cache.get(path) is not ResolverCache.MISSING :
+                return None
+
+        try:
+            handler_list = self.get_handler_list(path)
         except self.NoMatch:
-            pass
+            if use_negative_cache :
+                self.negative_cache.set(path, True)
+            return None
+
+        if self.cache is not None :
+            handler_list = tuple(handler_list)
+            self.cache.set(path, handler_list)
+        return (handler_list, {})
 
     def get_handler_list(self, path):
         """
@@ -45,6 +161,14 @@ class PathResolver:
         Note: path should not have a leading '/'.
         If it does, we consider the path to start with an empty segment (which can still map to a string__ handler module).
         """
+        if self.compiled_tree :
+            return self.compiled_tree.get_handler_list(path)
+        return self.walk_handler_list(path)
+
+    def walk_handler_list(self, path):
+        """
+        Uncompiled version of get_handler_list(), which probes ViewTreeNode.subtrees for every registered converter on every segment.
+        """
         previous_node = self.view_tree
         handler_list = [(previous_node, None)]
 
@@ -80,42 +204,18 @@ class PathResolver:
                         continue
 
                 # Are there any "capturing" subtrees defined?
-                try:
-                    node = previous_node.subtrees["int__"]
-                except KeyError:
-                    pass
-                else:
-                    try:
-                        arg = int(segment)
-                    except ValueError:
-                        pass
-                    else:
-                        handler_list.append((node, arg))
-                        path = rest
-                        previous_node = node
-                        continue
-
-                try:
-                    node = previous_node.subtrees["date__"]
-                except KeyError:
-                    pass
-                else:
+                node = None
+                for converter in get_converters() :
                     try:
-                        arg = date.fromisoformat(segment)
-                    except ValueError:
-                        pass
-                    else:
-                        handler_list.append((node, arg))
-                        path = rest
-                        previous_node = node
+                        node = previous_node.subtrees[converter.directory_name]
+                    except KeyError:
                         continue
-
-                try:
-                    node = previous_node.subtrees["string__"]
-                except KeyError:
-                    pass
-                else:
-                    handler_list.append((node, segment))
+                    arg = converter.match(segment)
+                    if arg is not None :
+                        break
+                    node = None
+                if node is not None :
+                    handler_list.append((node, arg))
                     path = rest
                     previous_node = node
                     continue
@@ -137,3 +237,337 @@ class PathResolver:
             raise self.NoMatch()
 
         return handler_list
+
+
+class FirstSegmentIndex:
+    '''
+        Which first path segments the root of a view tree can possibly accept, so that PathResolver can reject most paths for other views (ie. static files, admin) without walking the tree.
+
+        self.fixed
+            set of the root's fixed subtree names
+        self.matchers
+            converter.match for each capturing subtree of the root
+        self.accepts_any
+            True if the root has a path__ subtree (which accepts any path)
+        self.accepts_empty
+            True if the empty path (ie. the root itself) may resolve
+    '''
+    __slots__ = ('fixed', 'matchers', 'accepts_any', 'accepts_empty')
+
+    def __init__(self, fixed, matchers, accepts_any, accepts_empty):
+        self.fixed = frozenset(fixed)
+        self.matchers = tuple(matchers)
+        self.accepts_any = accepts_any
+        self.accepts_empty = accepts_empty
+
+    @classmethod
+    def from_subtrees(cls, subtrees, accepts_empty):
+        return cls(
+            [name for name in subtrees if not name.endswith('__')],
+            [converter.match for converter in get_converters() if converter.directory_name in subtrees],
+            'path__' in subtrees,
+            accepts_empty,
+        )
+
+    def may_match(self, path):
+        if not path :
+            return self.accepts_empty or self.accepts_any
+        if self.accepts_any :
+            return True
+        segment, slash, rest = path.partition('/')
+        # Without a trailing /, the segment could only match a path__ node
+        if not slash :
+            return False
+        if segment in self.fixed :
+            return True
+        for matcher in self.matchers :
+            if matcher(segment) is not None :
+                return True
+        return False
+
+class CompiledNode:
+    '''
+        Matcher tables for a single ViewTreeNode.
+
+        self.fixed
+            maps segment -> CompiledNode, for every non-capturing subtree
+        self.captures
+            tuple of (converter.match, CompiledNode), for only those capturing subtrees which exist, in converter priority order
+        self.path
+            CompiledNode for the path__ subtree, or None
+    '''
+    __slots__ = ('node', 'fixed', 'captures', 'path')
+
+    def __init__(self, node):
+        self.node = node
+        subtrees = node.subtrees
+        # Note - segments ending in '__' are reserved for capturing nodes, so they're never matched exactly
+        self.fixed = {
+            name: CompiledNode(subtree)
+            for name, subtree in subtrees.items()
+            if not name.endswith('__')
+        }
+        self.captures = tuple(
+            (converter.match, CompiledNode(subtrees[converter.directory_name]))
+            for converter in get_converters()
+            if converter.directory_name in subtrees
+        )
+        self.path = CompiledNode(subtrees['path__']) if 'path__' in subtrees else None
+
+class CompiledTree:
+    '''
+        A ViewTree, compiled once into CompiledNodes.
+        get_handler_list() returns exactly what PathResolver.walk_handler_list() would, without any exception handling or dict probes for capture kinds which don't exist.
+    '''
+    def __init__(self, view_tree):
+        self.root = CompiledNode(view_tree)
+
+    def get_handler_list(self, path):
+        compiled_node = self.root
+        handler_list = [(compiled_node.node, None)]
+
+        while path :
+            segment, slash, rest = path.partition('/')
+            # The last segment can only match a path__ node, unless it ends in /
+            if slash :
+                child = compiled_node.fixed.get(segment)
+                if child is not None :
+                    handler_list.append((child.node, None))
+                    path = rest
+                    compiled_node = child
+                    continue
+
+                for matcher, child in compiled_node.captures :
+                    arg = matcher(segment)
+                    if arg is not None :
+                        handler_list.append((child.node, arg))
+                        path = rest
+                        compiled_node = child
+                        break
+                else :
+                    child = None
+                if child is not None :
+                    continue
+
+            child = compiled_node.path
+            if child is None :
+                raise PathResolver.NoMatch()
+            handler_list.append((child.node, path))
+            path = ''
+            compiled_node = child
+
+        if not compiled_node.node.module :
+            raise PathResolver.NoMatch()
+
+        return handler_list
+
+class MergedNode:
+    '''
+        Like CompiledNode, but for a MergedTree, where nodes may come from different view trees.
+
+        self.node
+            the ViewTreeNode, or None for the root of a view tree, and for url prefix segments above the roots
+        self.root
+            the root ViewTreeNode of the view tree self.node belongs to.
+            For the point where view trees are mounted, the root whose view_tree_node.py handles that url itself (or None).
+    '''
+    __slots__ = ('node', 'root', 'fixed', 'captures', 'capture_nodes', 'path')
+
+    def __init__(self, node=None, root=None):
+        self.node = node
+        self.root = root
+        self.fixed = {}
+        self.captures = ()
+        # directory name (ie. 'int__') -> MergedNode
+        self.capture_nodes = {}
+        self.path = None
+
+    @classmethod
+    def from_view_tree_node(cls, node, root):
+        merged = cls(node, root)
+        merged._add_subtrees(node.subtrees, root)
+        return merged
+
+    def _add_subtrees(self, subtrees, root, conflicts=(), where=''):
+        '''Add every subtree (of the view tree with root) as a child. Appends to conflicts rather than replacing existing children.'''
+        for name, subtree in subtrees.items() :
+            if not name.endswith('__') :
+                if name in self.fixed :
+                    conflicts.append(f'{where}{name}/ is defined by both {_tree_name(self.fixed[name])} and {root.package_name}')
+                    continue
+                self.fixed[name] = MergedNode.from_view_tree_node(subtree, root)
+
+        for converter in get_converters() :
+            name = converter.directory_name
+            subtree = subtrees.get(name)
+            if subtree is None :
+                continue
+            if name in self.capture_nodes :
+                conflicts.append(f'{where}{name}/ is defined by both {_tree_name(self.capture_nodes[name])} and {root.package_name}')
+                continue
+            self.capture_nodes[name] = MergedNode.from_view_tree_node(subtree, root)
+        self.captures = tuple(
+            (converter.match, self.capture_nodes[converter.directory_name])
+            for converter in get_converters()
+            if converter.directory_name in self.capture_nodes
+        )
+
+        if 'path__' in subtrees :
+            if self.path is not None :
+                conflicts.append(f'{where}path__ is defined by both {_tree_name(self.path)} and {root.package_name}')
+            else :
+                self.path = MergedNode.from_view_tree_node(subtrees['path__'], root)
+
+def _tree_name(merged_node):
+    if merged_node.root is None :
+        return 'a url prefix'
+    return merged_node.root.package_name
+
+class MergedTree:
+    '''
+        Several view trees (each optionally under a url prefix), merged into MergedNodes, so that any path is resolved in a single walk.
+
+        Raises ConfigurationError (listing every conflict) if two trees define the same url.
+        Note - unlike separate tree views in urlpatterns, there's no fall through between trees: fixed names always take precedence over captures, and captures over path__, regardless of which tree they come from.
+    '''
+    def __init__(self, mounted_trees):
+        '''mounted_trees is a list of (prefix, ViewTree)'''
+        self.root = MergedNode()
+        conflicts = []
+        for prefix, view_tree in mounted_trees :
+            self._mount(prefix, view_tree, conflicts)
+        if conflicts :
+            raise ConfigurationError('Conflicting view trees:\n    ' + '\n    '.join(conflicts))
+
+    def _mount(self, prefix, view_tree, conflicts):
+        merged = self.root
+        where = ''
+        for segment in prefix.split('/')[:-1] :
+            child = merged.fixed.get(segment)
+            if child is None :
+                child = merged.fixed[segment] = MergedNode()
+            elif child.node is not None :
+                conflicts.append(f'{where}{segment}/ is defined by {_tree_name(child)}, but {view_tree.package_name} is mounted under it')
+                return
+            merged = child
+            where += segment + '/'
+
+        if view_tree.module is not None :
+            if merged.root is not None :
+                conflicts.append(f'{where or "/"} is defined by both {merged.root.package_name} and {view_tree.package_name}')
+            else :
+                merged.root = view_tree
+        for name, child in merged.fixed.items() :
+            if child.node is None and name in view_tree.subtrees :
+                conflicts.append(f'{where}{name}/ is defined by {view_tree.package_name}, but another tree is mounted under it')
+        merged._add_subtrees(
+            {name: subtree for name, subtree in view_tree.subtrees.items() if not (name in merged.fixed and merged.fixed[name].node is None)},
+            view_tree,
+            conflicts,
+            where,
+        )
+
+    def get_handler_list(self, path):
+        merged_node = self.root
+        handler_list = []
+
+        while path :
+            segment, slash, rest = path.partition('/')
+            if slash :
+                child = merged_node.fixed.get(segment)
+                if child is not None :
+                    if child.node is not None :
+                        handler_list.append((child.node, None))
+                    path = rest
+                    merged_node = child
+                    continue
+
+                for matcher, child in merged_node.captures :
+                    arg = matcher(segment)
+                    if arg is not None :
+                        handler_list.append((child.node, arg))
+                        path = rest
+                        merged_node = child
+                        break
+                else :
+                    child = None
+                if child is not None :
+                    continue
+
+            child = merged_node.path
+            if child is None :
+                raise PathResolver.NoMatch()
+            handler_list.append((child.node, path))
+            path = ''
+            merged_node = child
+
+        root = merged_node.root
+        node = merged_node.node if merged_node.node is not None else root
+        if node is None or not node.module :
+            raise PathResolver.NoMatch()
+
+        handler_list.insert(0, (root, None))
+        return handler_list
+
+class MergedPathResolver(PathResolver):
+    '''
+        Resolves paths against several view trees at once (see MergedTree), rather than trying one tree view after another.
+
+        Each view tree is still loaded (and refreshed, in DEBUG) by its own PathResolver (see self.resolvers), which tree_url() etc. use.
+    '''
+    def __init__(self, roots, cache_size=None, negative_cache_size=None, cache_eviction='lru', lazy=False, manifest=None):
+        '''
+            roots is a list of root module names, or (prefix, root_module_name) tuples, where prefix is a url prefix like 'api/' (or '').
+            The other options are as for PathResolver.
+        '''
+        self.resolvers = []
+        for root in roots :
+            prefix, root_module_name = ('', root) if isinstance(root, str) else root
+            prefix = prefix.lstrip('/')
+            if prefix and not prefix.endswith('/') :
+                raise ValueError(f'Url prefix must end with "/": {prefix!r}')
+            self.resolvers.append((prefix, PathResolver(root_module_name, compiled=False, lazy=lazy, manifest=manifest)))
+        self.cache = ResolverCache(cache_size, cache_eviction) if cache_size else None
+        self.negative_cache = ResolverCache(negative_cache_size, cache_eviction) if negative_cache_size else None
+        self.resolved = self.unresolved = self.rejected = 0
+        self._view_tree_changed()
+
+    def load_view_tree(self):
+        for prefix, resolver in self.resolvers :
+            resolver.load_view_tree()
+        self._view_tree_changed()
+
+    def warm(self):
+        for prefix, resolver in self.resolvers :
+            resolver.warm()
+
+    def refresh_view_tree(self):
+        changed = False
+        for prefix, resolver in self.resolvers :
+            changed = resolver.refresh_view_tree() or changed
+        if changed :
+            self._view_tree_changed()
+        return changed
+
+    def _view_tree_changed(self):
+        self.merged_tree = MergedTree([(prefix, resolver.view_tree) for prefix, resolver in self.resolvers])
+        root = self.merged_tree.root
+        self.first_segments = FirstSegmentIndex(
+            root.fixed,
+            [matcher for matcher, child in root.captures],
+            root.path is not None,
+            root.root is not None,
+        )
+        if self.cache is not None :
+            self.cache.clear()
+        if self.negative_cache is not None :
+            self.negative_cache.clear()
+        # Per branch caches, keyed by node (see PathResolver._view_tree_changed())
+        clear_link_headers()
+        PreprocessPlan.clear_cache()
+
+    def get_handler_list(self, path):
+        return self.merged_tree.get_handler_list(path)
+
+    def _root_is_stale(self):
+        return any(resolver.view_tree.is_stale() for prefix, resolver in self.resolvers)
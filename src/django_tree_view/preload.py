@@ -0,0 +1,76 @@
+'''
+preload.py
+
+Preload hints -> Link headers (and 103 Early Hints) for the resources a branch's pages need, declared per node.
+
+    PRELOAD = {
+        'books/books.css': 'style',     # href -> destination (the "as" attribute)
+        'books/books.js': 'script',
+    }
+    PRECONNECT = ['https://fonts.example.com']
+
+hrefs which aren't absolute urls (or paths) are static files, resolved with django's static().
+Hints are inherited down the branch, like preprocess() - the Link header of each page lists every hint of every node above it (its own last), without duplicates.
+The header is computed once per node (on its first request), not per request, and recomputed after the view tree changes (see PathResolver._view_tree_changed()).
+
+Early Hints:
+    If the server provides a wsgi.early_hints callable in the WSGI environ (ie. gunicorn), GET requests send the Link header as a 103 Early Hints response, before preprocess() and the handler run.
+    Note that Early Hints are sent before authorization, so they shouldn't list anything private.
+'''
+from django.templatetags.static import static
+
+_link_headers = {}
+
+def get_node_links(module):
+    '''Return the list of Link header values a view_tree_node.py module declares'''
+    links = []
+    for href, destination in getattr(module, 'PRELOAD', {}).items() :
+        link = f'<{_url(href)}>; rel=preload; as={destination}'
+        if destination == 'font' :
+            # Fonts are always fetched in CORS mode, so the preload must be, too
+            link += '; crossorigin'
+        links.append(link)
+    for href in getattr(module, 'PRECONNECT', ()) :
+        links.append(f'<{_url(href)}>; rel=preconnect')
+    return links
+
+def get_link_header(handlers):
+    '''Return the Link header value for the branch of handlers, or None if no node in it declares any hints'''
+    node = handlers[-1][0]
+    try :
+        return _link_headers[node]
+    except KeyError :
+        pass
+    links = []
+    for n, arg in handlers :
+        for link in n.dispatch.links :
+            if link not in links :
+                links.append(link)
+    header = ', '.join(links) or None
+    _link_headers[node] = header
+    return header
+
+def clear_link_headers():
+    '''Clear every node's cached Link header'''
+    _link_headers.clear()
+
+def send_early_hints(request, link_header):
+    early_hints = request.META.get('wsgi.early_hints')
+    if early_hints is not None and request.method == 'GET' :
+        early_hints([('Link', link_header)])
+
+def add_link_header(response, link_header):
+    existing = response.get('Link')
+    if existing is not None and link_header in existing :
+        # ie. a cached response
+        return response
+    if existing is not None :
+        response['Link'] = f'{existing}, {link_header}'
+    else :
+        response['Link'] = link_header
+    return response
+
+def _url(href):
+    if href.startswith(('/', 'http://', 'https://')) :
+        return href
+    return static(href)
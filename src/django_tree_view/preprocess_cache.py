@@ -0,0 +1,80 @@
+'''
+preprocess_cache.py
+
+Implements PreprocessCache -> request-scoped memoization of preprocess() results, used by test_page_visibility().
+'''
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django_early_return import EarlyReturn
+
+class _Raised:
+    __slots__ = ('exception',)
+    def __init__(self, exception):
+        self.exception = exception
+
+class PreprocessCache:
+    '''
+        Maps a prefix of a handler list -> the branch data after running preprocess() for every node in that prefix (or the exception one of them raised).
+
+        Within a single request, the branch data passed to a node depends only on the nodes (and captured args) above it, so a prefix identifies the incoming branch data.
+
+        A node can opt out by setting MEMOIZE_PREPROCESS = False in its module. Its results (and those of its descendants) are then never cached.
+
+        self.calls
+            number of preprocess() functions actually called
+        self.saved
+            number of preprocess() calls avoided, by reusing cached results
+    '''
+    # preprocess() raising one of these denies access to the branch - we cache them, too
+    cached_exceptions = (EarlyReturn, PermissionDenied, Http404)
+
+    REQUEST_ATTRIBUTE = '_tree_view_preprocess_cache'
+
+    def __init__(self):
+        self._results = {}
+        self.calls = 0
+        self.saved = 0
+
+    @classmethod
+    def for_request(cls, request):
+        try :
+            return getattr(request, cls.REQUEST_ATTRIBUTE)
+        except AttributeError :
+            cache = cls()
+            setattr(request, cls.REQUEST_ATTRIBUTE, cache)
+            return cache
+
+    def resume(self, handlers):
+        '''
+            handlers must be a tuple.
+
+            Returns (start, limit, branch_data):
+                start - index of the first handler whose preprocess() still has to be run
+                limit - results for handlers at index >= limit must not be recorded
+                branch_data - a copy of the cached branch data (to be updated from start onward)
+
+            Re-raises the cached exception, if a prefix of handlers previously raised one.
+        '''
+        limit = len(handlers)
+        for i, (node, arg) in enumerate(handlers) :
+            dispatch = node.dispatch
+            if dispatch.preprocess is not None and not dispatch.memoize_preprocess :
+                limit = i
+                break
+
+        for end in range(limit, 0, -1) :
+            result = self._results.get(handlers[:end])
+            if result is None :
+                continue
+            self.saved += sum(1 for node, arg in handlers[:end] if node.dispatch.preprocess is not None)
+            if isinstance(result, _Raised) :
+                raise result.exception
+            return end, limit, dict(result)
+
+        return 0, limit, {}
+
+    def record(self, handlers, index, branch_data):
+        self._results[handlers[:index+1]] = dict(branch_data)
+
+    def record_exception(self, handlers, index, exception):
+        self._results[handlers[:index+1]] = _Raised(exception)
@@ -0,0 +1,212 @@
+'''
+preprocess_graph.py
+
+Implements PreprocessPlan -> running independent preprocess() steps of a branch concurrently.
+
+A node opts in by declaring which branch data keys its preprocess() reads and returns:
+    NEEDS = ('user',)
+    PRODUCES = ('permissions',)
+
+A declared step only waits for earlier declared steps which produce something it NEEDS (and for the nearest undeclared step above it).
+Undeclared steps (no PRODUCES) keep the sequential behaviour - they wait for every step above them, and every step below waits for them.
+Each step receives the branch data of the steps it (transitively) depends on, and results are merged in branch order, as they would be sequentially.
+
+view() runs declared steps in a bounded thread pool (see max_workers), async_view() as asyncio tasks (sync steps run in sync_to_async(thread_sensitive=False)).
+Undeclared steps always run on the request's thread (in async_view(), with sync_to_async(thread_sensitive=True)), so they keep its database connection and transaction.
+The first exception (ie. EarlyReturn) cancels every step which hasn't started, and is raised - running threads can't be interrupted, but their results are discarded.
+
+Note - steps run in pool threads use their own database connections, so declare steps which call other services, not ones which query the database.
+'''
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import close_old_connections
+
+max_workers = 8
+'''Size of the thread pool for sync (WSGI) requests - must be set before the first concurrent request'''
+
+_executor = None
+_executor_lock = Lock()
+_plans = {}
+
+class PreprocessPlan:
+    '''
+        self.steps
+            list of (index into handlers, positions of the steps it depends on, positions of all the steps it transitively depends on, in order)
+    '''
+    __slots__ = ('steps',)
+
+    def __init__(self, handlers):
+        self.steps = []
+        last_barrier = None
+        since_barrier = []
+        producers = {}
+        for i, (node, arg) in enumerate(handlers) :
+            dispatch = node.dispatch
+            if dispatch.preprocess is None :
+                continue
+            pos = len(self.steps)
+            deps = set() if last_barrier is None else {last_barrier}
+            if dispatch.produces is None :
+                deps.update(since_barrier)
+                last_barrier = pos
+                since_barrier = []
+                producers = {}
+            else :
+                for key in dispatch.needs :
+                    deps.update(producers.get(key, ()))
+                for key in dispatch.produces :
+                    producers.setdefault(key, []).append(pos)
+                since_barrier.append(pos)
+            ancestors = set(deps)
+            for d in deps :
+                ancestors.update(self.steps[d][2])
+            self.steps.append((i, frozenset(deps), tuple(sorted(ancestors))))
+
+    @property
+    def is_concurrent(self):
+        '''False if every step depends on the one before it (ie. nothing is declared), so there's nothing to gain'''
+        return any(pos - 1 not in deps for pos, (i, deps, ancestors) in enumerate(self.steps) if pos)
+
+    @classmethod
+    def for_handlers(cls, handlers):
+        '''Return the plan for handlers, or None if it isn't concurrent. Plans are computed once per branch.'''
+        if not any(node.dispatch.produces is not None for node, arg in handlers) :
+            return None
+        nodes = tuple(node for node, arg in handlers)
+        try :
+            return _plans[nodes]
+        except KeyError :
+            pass
+        plan = cls(handlers)
+        if not plan.is_concurrent :
+            plan = None
+        _plans[nodes] = plan
+        return plan
+
+    @classmethod
+    def clear_cache(cls):
+        '''Clear every branch's cached plan'''
+        _plans.clear()
+
+    def _inputs(self, branch_data, results, ancestors):
+        inputs = dict(branch_data)
+        for d in ancestors :
+            if results[d] :
+                inputs.update(results[d])
+        return inputs
+
+    def run(self, branch_data, request, handlers, timer=None):
+        '''
+            Run declared steps in the thread pool (and undeclared ones on this thread), and merge their results into branch_data.
+            If timer (a timing.RequestTimer) is given, each step is timed where it runs, so waiting for its dependencies isn't included.
+        '''
+        executor = _get_executor()
+        results = [None] * len(self.steps)
+        pending = list(range(len(self.steps)))
+        done = set()
+        futures = {}
+        try :
+            while pending or futures :
+                for pos in list(pending) :
+                    i, deps, ancestors = self.steps[pos]
+                    if deps <= done :
+                        pending.remove(pos)
+                        node, arg = handlers[i]
+                        inputs = self._inputs(branch_data, results, ancestors)
+                        if node.dispatch.produces is None :
+                            # Note - nothing else can be running, since an undeclared step waits for every step above it, and every step below waits for it
+                            results[pos] = _timed_call(request, node, arg, inputs, timer)
+                            done.add(pos)
+                        else :
+                            futures[executor.submit(_run_in_thread, request, node, arg, inputs, timer)] = pos
+                if not futures :
+                    continue
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished :
+                    pos = futures.pop(future)
+                    results[pos] = future.result()
+                    done.add(pos)
+        finally :
+            for future in futures :
+                future.cancel()
+        return _merge(branch_data, results)
+
+    async def async_run(self, branch_data, request, handlers, timer=None):
+        '''Async version of run(), with a task per step'''
+        results = [None] * len(self.steps)
+        tasks = []
+
+        async def run_step(pos):
+            i, deps, ancestors = self.steps[pos]
+            if deps :
+                await asyncio.gather(*(tasks[d] for d in deps))
+            node, arg = handlers[i]
+            inputs = self._inputs(branch_data, results, ancestors)
+            if timer is None :
+                results[pos] = await call_step(node, arg, inputs)
+                return
+            start = timer.begin()
+            try :
+                results[pos] = await call_step(node, arg, inputs)
+            finally :
+                timer.end('preprocess', node.view_tree_path, start)
+
+        async def call_step(node, arg, inputs):
+            if node.dispatch.preprocess_is_async :
+                p = node.dispatch.preprocess
+                return await (p(request, **inputs) if arg is None else p(request, arg, **inputs))
+            if node.dispatch.produces is None :
+                return await sync_to_async(_call)(request, node, arg, inputs)
+            return await sync_to_async(_run_in_thread, thread_sensitive=False)(request, node, arg, inputs)
+
+        for pos in range(len(self.steps)) :
+            tasks.append(asyncio.ensure_future(run_step(pos)))
+        try :
+            await asyncio.gather(*tasks)
+        except BaseException :
+            for task in tasks :
+                task.cancel()
+            raise
+        return _merge(branch_data, results)
+
+def _call(request, node, arg, inputs):
+    dispatch = node.dispatch
+    p = dispatch.preprocess
+    if dispatch.preprocess_is_async :
+        p = async_to_sync(p)
+    if arg is None :
+        return p(request, **inputs)
+    return p(request, arg, **inputs)
+
+def _timed_call(request, node, arg, inputs, timer):
+    if timer is None :
+        return _call(request, node, arg, inputs)
+    start = timer.begin()
+    try :
+        return _call(request, node, arg, inputs)
+    finally :
+        timer.end('preprocess', node.view_tree_path, start)
+
+def _run_in_thread(request, node, arg, inputs, timer=None):
+    try :
+        return _timed_call(request, node, arg, inputs, timer)
+    finally :
+        # As at the end of a request - don't keep connections past CONN_MAX_AGE
+        close_old_connections()
+
+def _merge(branch_data, results):
+    for r in results :
+        if r :
+            branch_data.update(r)
+    return branch_data
+
+def _get_executor():
+    global _executor
+    if _executor is None :
+        with _executor_lock :
+            if _executor is None :
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tree_view_preprocess')
+    return _executor
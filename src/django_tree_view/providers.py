@@ -0,0 +1,42 @@
+'''
+providers.py
+
+Lazy branch data -> values which are only computed if a handler (or a descendant's preprocess()) actually uses them.
+
+A view_tree_node.py may declare:
+    PROVIDERS = {
+        'profile': get_profile,
+    }
+    def get_profile(request, **branch_data):
+        return Profile.objects.get(user=request.user)
+
+Every name in PROVIDERS is added to the branch data (after the module's own preprocess() runs) as a django SimpleLazyObject.
+The provider is called (with the request and the branch data at that point) on first access of any attribute, and the result is memoized for the rest of the request.
+
+Note - since values are proxies, providers should return objects (ie. model instances) rather than None or plain values, which don't compare or hash like the original.
+Note - providers are sync functions. In async handlers, first access them within sync_to_async().
+'''
+from functools import partial
+
+from django.utils.functional import SimpleLazyObject
+
+def with_providers(preprocess, providers, is_async):
+    '''
+        Return a preprocess() function which calls preprocess (which may be None), then adds a lazy value for every provider.
+    '''
+    providers = tuple(providers.items())
+    if is_async :
+        async def preprocess_with_providers(request, *args, **branch_data):
+            return _provide(providers, request, branch_data, await preprocess(request, *args, **branch_data))
+    else :
+        def preprocess_with_providers(request, *args, **branch_data):
+            r = preprocess(request, *args, **branch_data) if preprocess is not None else None
+            return _provide(providers, request, branch_data, r)
+    return preprocess_with_providers
+
+def _provide(providers, request, branch_data, r):
+    result = dict(r) if r else {}
+    data = {**branch_data, **result}
+    for name, provider in providers :
+        data[name] = result[name] = SimpleLazyObject(partial(provider, request, **data))
+    return result
@@ -0,0 +1,68 @@
+'''
+resolver_cache.py
+
+Implements ResolverCache -> a bounded, thread-safe mapping used by PathResolver to remember resolved (and unresolvable) paths.
+'''
+from collections import OrderedDict
+from threading import Lock
+
+class ResolverCache:
+    '''
+        A bounded cache with hit/miss/eviction counters.
+
+        eviction is either:
+            'lru' - evict the least recently used entry (hits refresh an entry)
+            'fifo' - evict the oldest entry (hits don't touch the ordering, which is slightly cheaper)
+    '''
+    MISSING = object()
+
+    def __init__(self, maxsize, eviction='lru'):
+        if maxsize < 1 :
+            raise ValueError('maxsize must be at least 1')
+        if eviction not in ('lru', 'fifo') :
+            raise ValueError(f'Unknown eviction policy: {eviction!r}')
+        self.maxsize = maxsize
+        self.eviction = eviction
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        '''Return the cached value, or ResolverCache.MISSING'''
+        with self._lock :
+            try :
+                value = self._data[key]
+            except KeyError :
+                self.misses += 1
+                return self.MISSING
+            if self.eviction == 'lru' :
+                self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock :
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize :
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        '''Remove all entries. Counters are kept.'''
+        with self._lock :
+            self._data.clear()
+
+    def info(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            size=len(self._data),
+            maxsize=self.maxsize,
+        )
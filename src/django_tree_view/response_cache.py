@@ -0,0 +1,149 @@
+'''
+response_cache.py
+
+Implements CachePolicy -> caching of GET responses through Django's cache framework, declared per node with a module level CACHE dict.
+
+    CACHE = dict(
+        timeout=300,            # seconds (default: the cache's default timeout)
+        vary=['header:Accept-Language', 'cookie:theme', 'query', 'user'],  # extra inputs to the cache key, beside the path (default: none)
+        public=False,           # see below
+        anonymous_only=False,   # only use the cache for anonymous users
+        cache='default',        # which of settings.CACHES to use
+    )
+
+Authorization:
+    By default (public=False), every preprocess() in the branch still runs before the cache is checked, so a request which fails authorization (ie. preprocess() raises EarlyReturn) never sees a cached response.
+    Only the handler is skipped.
+    Set public=True for content which is the same for everyone - cache hits then skip preprocess() as well.
+
+Invalidation:
+    Every entry is tagged with its node's ancestry, both by view_tree_path (ie. 'books/int__') and by captured args (ie. 'books/int__' with (67,)).
+    invalidate_tree_cache('books/int__') invalidates every entry at or below any book,
+    invalidate_tree_cache('books/int__', 67) only those at or below book 67.
+
+    Tags are implemented as version tokens, stored in the cache, which are part of every entry's key, so invalidation is a single cache write.
+    If a tag is evicted, entries tagged with it are treated as invalidated.
+
+Only GET responses (which HEAD requests are served from, too) are stored.
+Only 200 responses without cookies, Vary headers, or Cache-Control private or no-store are cached.
+Responses which used the CSRF token, or the session (unless the key varies on 'user', or anonymous_only is set), aren't cached either - middleware makes them vary on Cookie.
+Keys include the host, as well as the path.
+'''
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.utils.cache import cc_delim_re
+from django.utils.crypto import md5
+
+_OPTIONS = {'timeout', 'vary', 'public', 'anonymous_only', 'cache'}
+_DEFAULT_TIMEOUT = object()
+
+_KEY_PREFIX = 'django_tree_view.response'
+_TAG_PREFIX = 'django_tree_view.tag'
+
+class CachePolicy:
+    __slots__ = ('timeout', 'vary', 'public', 'anonymous_only', 'cache_alias')
+
+    def __init__(self, options):
+        unknown = set(options) - _OPTIONS
+        if unknown :
+            raise ValueError(f'Unknown CACHE options: {", ".join(sorted(unknown))}')
+        self.timeout = options.get('timeout', _DEFAULT_TIMEOUT)
+        self.vary = tuple(options.get('vary', ()))
+        for v in self.vary :
+            if v not in ('query', 'user') and not v.startswith(('header:', 'cookie:')) :
+                raise ValueError(f'Invalid CACHE vary input: {v!r}')
+        self.public = options.get('public', False)
+        self.anonymous_only = options.get('anonymous_only', False)
+        self.cache_alias = options.get('cache', 'default')
+
+    def applies(self, request):
+        if self.anonymous_only :
+            user = getattr(request, 'user', None)
+            return user is None or not user.is_authenticated
+        return True
+
+    def get_key(self, request, handlers):
+        cache = caches[self.cache_alias]
+        parts = [request.get_host(), request.path]
+        for v in self.vary :
+            parts.append(_vary_value(request, v))
+        parts.extend(_tag_versions(cache, _tags(handlers)))
+        return f'{_KEY_PREFIX}.{md5(repr(parts).encode()).hexdigest()}'
+
+    def get(self, key):
+        return caches[self.cache_alias].get(key)
+
+    def store(self, key, response, request):
+        if not self._is_cacheable(response, request) :
+            return
+        cache = caches[self.cache_alias]
+        def set_cache(response):
+            # Note - rendering may have used the CSRF token or the session
+            if not self._is_cacheable(response, request) :
+                return
+            if self.timeout is _DEFAULT_TIMEOUT :
+                cache.set(key, response)
+            else :
+                cache.set(key, response, self.timeout)
+        # Like django's UpdateCacheMiddleware, wait until TemplateResponses have been rendered
+        if hasattr(response, 'render') and callable(response.render) and not response.is_rendered :
+            response.add_post_render_callback(set_cache)
+        else :
+            set_cache(response)
+
+    def _is_cacheable(self, response, request):
+        if response.status_code != 200 or response.streaming or response.cookies :
+            return False
+        # Keys only include the declared vary inputs, so anything else the response varies on can't be cached
+        if response.has_header('Vary') :
+            return False
+        # Note - we store responses before middleware runs, so we check what makes CsrfViewMiddleware and SessionMiddleware add Vary: Cookie later
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE') :
+            return False
+        session = getattr(request, 'session', None)
+        if session is not None and session.accessed and 'user' not in self.vary and not self.anonymous_only :
+            return False
+        cache_control = {d.strip().lower() for d in cc_delim_re.split(response.get('Cache-Control', ''))}
+        return not cache_control & {'private', 'no-store'}
+
+def invalidate_tree_cache(view_tree_path, *args, cache='default'):
+    '''
+        Invalidate every cached response at or below the node at view_tree_path (ie. 'books/int__').
+        If args are given, only responses for urls with those captured args (ie. 67, for '/books/67/...') are invalidated.
+    '''
+    caches[cache].set(_tag_key(view_tree_path.strip('/'), args if args else None), uuid4().hex, None)
+
+def _tags(handlers):
+    tags = []
+    args = []
+    for node, arg in handlers :
+        if arg is not None :
+            args.append(arg)
+        tags.append((node.view_tree_path, None))
+        tags.append((node.view_tree_path, tuple(args)))
+    return tags
+
+def _tag_key(view_tree_path, args):
+    return f'{_TAG_PREFIX}.{md5(repr((view_tree_path, args)).encode()).hexdigest()}'
+
+def _tag_versions(cache, tags):
+    keys = [_tag_key(path, args) for path, args in tags]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing :
+        # Note - a missing (ie. evicted) tag gets a new version, which invalidates anything cached under the old one
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+def _vary_value(request, v):
+    if v == 'query' :
+        return request.META.get('QUERY_STRING', '')
+    if v == 'user' :
+        user = getattr(request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+    kind, name = v.split(':', 1)
+    if kind == 'header' :
+        return request.headers.get(name)
+    return request.COOKIES.get(name)
@@ -0,0 +1,85 @@
+'''
+reverse.py
+
+Building urls for view tree nodes (the tree view equivalent of django's reverse()).
+
+PathResolver builds a UrlTemplate for every reachable node when the view tree is loaded, so building a url is just a dict lookup and a str.format().
+'''
+from django.urls import get_resolver, get_script_prefix, NoReverseMatch
+
+from .converters import get_converter, PathConverter
+from .urlconf import find_tree_view
+
+_path_converter = PathConverter()
+
+class UrlTemplate:
+    '''
+        self.format
+            the url of the node, relative to the root of the view tree, with a {} for each captured argument
+        self.converters
+            the converter for each captured argument
+    '''
+    __slots__ = ('view_tree_path', 'format', 'converters')
+
+    def __init__(self, view_tree_path, format, converters):
+        self.view_tree_path = view_tree_path
+        self.format = format
+        self.converters = converters
+
+    def url(self, args):
+        if len(args) != len(self.converters) :
+            raise NoReverseMatch(f'{self.view_tree_path!r} requires {len(self.converters)} argument(s), received {len(args)}')
+        segments = []
+        for converter, arg in zip(self.converters, args) :
+            segment = converter.reverse(arg)
+            if segment is None :
+                raise NoReverseMatch(f'{arg!r} is not a valid {converter.name}__ argument for {self.view_tree_path!r}')
+            segments.append(segment)
+        return self.format.format(*segments)
+
+def build_url_templates(view_tree):
+    '''Return a dict mapping view_tree_path -> UrlTemplate, for every reachable node in view_tree'''
+    templates = {}
+    _add_url_templates(templates, view_tree, '', ())
+    return templates
+def _add_url_templates(templates, node, format, converters):
+    templates[node.view_tree_path] = UrlTemplate(node.view_tree_path, format, converters)
+    for name, subtree in node.subtrees.items() :
+        if name == 'path__' :
+            # Note - path__ consumes the rest of the url, so its subtrees are unreachable
+            templates[subtree.view_tree_path] = UrlTemplate(subtree.view_tree_path, format + '{}', converters + (_path_converter,))
+            continue
+        converter = get_converter(name)
+        if converter is not None :
+            _add_url_templates(templates, subtree, format + '{}/', converters + (converter,))
+        elif not name.endswith('__') :
+            literal = name.replace('{', '{{').replace('}', '}}')
+            _add_url_templates(templates, subtree, format + literal + '/', converters)
+        # Any other names ending in '__' are unreachable
+
+def tree_url(view_tree_path, *args, root_module_name=None, urlconf=None, request=None):
+    '''
+        Return the (absolute path) url of the view tree node at view_tree_path (ie. 'books/int__/'), given its captured arguments (ie. a book id).
+
+        If your urlconf contains multiple tree views, pass root_module_name to choose one (otherwise, we use the first).
+
+        Passing the current request is optional, but makes this faster when building many urls (we remember the script prefix on the request).
+
+        Raises NoReverseMatch if there is no such node, or the arguments are invalid.
+    '''
+    prefix, resolver = find_tree_view(get_resolver(urlconf), root_module_name)
+    try :
+        template = resolver.url_templates[view_tree_path.strip('/')]
+    except KeyError :
+        raise NoReverseMatch(f'{view_tree_path!r} is not a node in view tree {resolver.root_module_name!r}')
+    return _get_script_prefix(request) + prefix + template.url(args)
+
+def _get_script_prefix(request):
+    # Note - get_script_prefix() is surprisingly slow (it's stored in an asgiref Local)
+    if request is None :
+        return get_script_prefix()
+    try :
+        return request._tree_url_script_prefix
+    except AttributeError :
+        script_prefix = request._tree_url_script_prefix = get_script_prefix()
+        return script_prefix
@@ -0,0 +1,104 @@
+'''
+routes.py
+
+Enumerating a view tree -> every routable node (ie. for smoke tests), and every concrete url (ie. for sitemaps).
+
+A node is routable if it's reachable and has a view_tree_node.py.
+
+To enumerate concrete urls below a capturing node (int__, path__, etc.), its view_tree_node.py must define an enumerate_args() generator:
+    def enumerate_args(*args):
+        yield from Book.objects.values_list('id', flat=True).iterator()
+args are the values captured above the node (ie. a book id, for a review node below books/int__/).
+Capturing nodes without enumerate_args() are skipped, along with everything below them.
+'''
+from itertools import islice
+
+from django.urls import get_resolver, get_script_prefix
+
+from .converters import get_converter
+from .urlconf import find_tree_view
+
+class Route:
+    '''
+        self.pattern
+            the url of the node, with a placeholder for each captured argument (ie. '/books/<int>/')
+        self.methods
+            the (lower case) methods the node supports, as reported in its Allow header
+    '''
+    __slots__ = ('node', 'view_tree_path', 'pattern', 'methods', '_prefix', '_template')
+
+    def __init__(self, node, template, prefix):
+        self.node = node
+        self.view_tree_path = node.view_tree_path
+        self.pattern = prefix + template.format.format(*[f'<{c.name}>' for c in template.converters])
+        self.methods = node.dispatch.allowed_methods
+        self._prefix = prefix
+        self._template = template
+
+    def url(self, *args):
+        '''Same as tree_url(self.view_tree_path, *args)'''
+        return self._prefix + self._template.url(args)
+
+    def __repr__(self):
+        return f'<Route {self.pattern}>'
+
+def iter_routes(root_module_name=None, urlconf=None):
+    '''
+        Yield a Route for every routable node of the tree view for root_module_name (default: the first tree view in urlconf), depth first.
+
+        Note - with make_tree_view(lazy=True), this imports every module.
+    '''
+    prefix, resolver = find_tree_view(get_resolver(urlconf), root_module_name)
+    prefix = get_script_prefix() + prefix
+    templates = resolver.url_templates
+    for node in _iter_nodes(resolver.view_tree, templates) :
+        if node.module is not None :
+            yield Route(node, templates[node.view_tree_path], prefix)
+
+def iter_urls(root_module_name=None, urlconf=None, method=None):
+    '''
+        Lazily yield (url, Route) for every concrete url of every routable node, using the enumerate_args() generators of capturing nodes (see module docstring).
+
+        If method (ie. 'get') is given, only nodes which support it are included.
+
+        Urls are generated depth first, so only the current branch of arguments is held in memory.
+    '''
+    prefix, resolver = find_tree_view(get_resolver(urlconf), root_module_name)
+    prefix = get_script_prefix() + prefix
+    routes = {}
+    yield from _iter_node_urls(resolver.view_tree, (), resolver.url_templates, prefix, routes, method)
+
+def iter_url_batches(batch_size=1000, **kwargs):
+    '''Same as iter_urls() (accepting the same keyword arguments), but yield lists of (url, Route), of up to batch_size each'''
+    urls = iter_urls(**kwargs)
+    while True :
+        batch = list(islice(urls, batch_size))
+        if not batch :
+            return
+        yield batch
+
+def _iter_nodes(node, templates):
+    yield node
+    for name, subtree in sorted(node.subtrees.items()) :
+        # Note - url_templates contains exactly the reachable nodes
+        if subtree.view_tree_path in templates :
+            yield from _iter_nodes(subtree, templates)
+
+def _iter_node_urls(node, args, templates, prefix, routes, method):
+    if node.module is not None and (method is None or method in node.dispatch.handlers) :
+        route = routes.get(node.view_tree_path)
+        if route is None :
+            route = routes[node.view_tree_path] = Route(node, templates[node.view_tree_path], prefix)
+        yield route.url(*args), route
+
+    for name, subtree in sorted(node.subtrees.items()) :
+        if subtree.view_tree_path not in templates :
+            continue
+        if name == 'path__' or get_converter(name) is not None :
+            enumerate_args = getattr(subtree.module, 'enumerate_args', None)
+            if enumerate_args is None :
+                continue
+            for arg in enumerate_args(*args) :
+                yield from _iter_node_urls(subtree, args + (arg,), templates, prefix, routes, method)
+        else :
+            yield from _iter_node_urls(subtree, args, templates, prefix, routes, method)
@@ -0,0 +1,124 @@
+'''
+templates.py
+
+Implements Loader -> a Django template loader for templates stored beside view_tree_node.py modules, render_node_template() and stream_node_template().
+
+Usage:
+    TEMPLATES = [
+        {
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {
+                'loaders': [
+                    # Optionally, pass a list of root module names (default: every tree view in ROOT_URLCONF)
+                    'django_tree_view.templates.Loader',
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ],
+            },
+        },
+    ]
+
+Template names are relative to the root of the view tree (ie. 'books/int__/detail.html'), so each name maps directly to a single file in each view tree.
+'''
+from importlib import import_module
+import os
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.template.loaders import filesystem
+from django.template.response import TemplateResponse
+
+from .urlconf import iter_path_resolvers
+
+class Loader(filesystem.Loader):
+    '''
+        Compiled templates are kept in memory (as with django's cached.Loader).
+        When settings.DEBUG, cached templates are checked against the mtime of their file on every use, and recompiled if it changed.
+        Otherwise, missing templates are cached, too.
+    '''
+    def __init__(self, engine, root_module_names=None):
+        super().__init__(engine)
+        self.root_module_names = root_module_names
+        self._dirs = None
+        self.template_cache = {}
+
+    def get_dirs(self):
+        if self._dirs is None :
+            self._dirs = _get_view_tree_dirs(self.root_module_names)
+        return self._dirs
+
+    def get_template(self, template_name, skip=None):
+        # Note - skip is used when resolving {% extends %} recursively - don't cache those lookups
+        if skip :
+            return super().get_template(template_name, skip)
+
+        cached = self.template_cache.get(template_name)
+        if cached is not None :
+            template, mtime = cached
+            if template is None :
+                if not settings.DEBUG :
+                    raise TemplateDoesNotExist(template_name)
+            elif not settings.DEBUG or _mtime(template.origin.name) == mtime :
+                return template
+
+        try :
+            template = super().get_template(template_name)
+        except TemplateDoesNotExist :
+            self.template_cache[template_name] = (None, None)
+            raise
+        self.template_cache[template_name] = (template, _mtime(template.origin.name))
+        return template
+
+    def reset(self):
+        '''Called by django's autoreloader when template files change'''
+        self.template_cache.clear()
+        self._dirs = None
+
+def _get_view_tree_dirs(root_module_names):
+    if root_module_names is None :
+        return [os.fspath(r.view_tree.package_path) for r in iter_path_resolvers()]
+    resolvers = {r.root_module_name: r for r in iter_path_resolvers()}
+    dirs = []
+    for name in root_module_names :
+        if name in resolvers :
+            dirs.append(os.fspath(resolvers[name].view_tree.package_path))
+        else :
+            # Not in the urlconf - we don't need the whole tree, just its location
+            dirs.append(os.path.dirname(import_module(name).__file__))
+    return dirs
+
+def _mtime(path):
+    try :
+        return os.stat(path).st_mtime_ns
+    except OSError :
+        return None
+
+def render_node_template(request, template_name, context=None, content_type=None, status=None, using=None):
+    '''
+        Return a TemplateResponse for template_name, relative to the directory of the node handling request (see request.view_tree_dir).
+
+        ie. in books/int__/view_tree_node.py:
+            def get(request, book, **kwargs):
+                return render_node_template(request, 'detail.html', dict(book=book))
+    '''
+    return TemplateResponse(request, request.view_tree_dir + template_name, context, content_type, status, using=using)
+
+def stream_node_template(request, template_name, items, context=None, name='item', using=None):
+    '''
+        Return an iterator of template_name (relative to the directory of the node handling request) rendered once per item in items, with context plus {name: item}.
+        The template is loaded immediately (so a missing template raises before the response starts), but each item is only rendered as the response is sent.
+
+        ie. in books/view_tree_node.py:
+            STREAMING_CONTENT_TYPE = 'text/csv; charset=utf-8'
+            def get(request, **kwargs):
+                yield 'id,title\n'
+                yield from stream_node_template(request, 'row.csv', Book.objects.iterator(), name='book')
+    '''
+    template = get_template(request.view_tree_dir + template_name, using=using)
+    return _render_items(template, request, items, dict(context or {}), name)
+
+def _render_items(template, request, items, context, name):
+    for item in items :
+        context[name] = item
+        yield template.render(context, request)
@@ -0,0 +1,13 @@
+from django import template
+
+from django_tree_view.reverse import tree_url as _tree_url
+
+register = template.Library()
+
+@register.simple_tag(takes_context=True)
+def tree_url(context, view_tree_path, *args, root_module_name=None):
+    '''
+        {% tree_url 'books/int__/' book.id %}
+        {% tree_url 'books/int__/' book.id as book_url %}
+    '''
+    return _tree_url(view_tree_path, *args, root_module_name=root_module_name, request=context.get('request'))
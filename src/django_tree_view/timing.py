@@ -0,0 +1,188 @@
+'''
+timing.py
+
+Opt-in instrumentation -> timing of path resolution, each node's preprocess(), and the handler.
+
+Timing is off until you add an observer (or enable the Server-Timing header).
+While it's off, the only cost is checking timing.enabled, once in PathResolver.__call__() and once per request in view().
+
+Observers are called as observer(phase, view_tree_path, seconds), where phase is one of:
+    'resolve'
+        resolving a path (view_tree_path is that of the matched node, or None if the path did not resolve)
+    'preprocess'
+        a single node's preprocess() (nodes without one are skipped) - steps which run concurrently (see PreprocessPlan) are timed individually, excluding time spent waiting for other steps
+    'handler'
+        the handler function of the matched node
+'''
+from bisect import bisect_left
+from contextvars import ContextVar
+import threading
+from time import perf_counter
+
+enabled = False
+_observers = ()
+_server_timing = False
+
+# (view_tree_path, seconds) of the most recent resolution in this thread/task, for the Server-Timing header
+_last_resolve = ContextVar('tree_view_last_resolve', default=None)
+
+def _update_enabled():
+    global enabled
+    enabled = bool(_observers) or _server_timing
+
+def add_timing_observer(observer):
+    global _observers
+    _observers = _observers + (observer,)
+    _update_enabled()
+
+def remove_timing_observer(observer):
+    global _observers
+    _observers = tuple(o for o in _observers if o is not observer)
+    _update_enabled()
+
+def enable_server_timing(enable=True):
+    '''
+        Add a Server-Timing header (https://www.w3.org/TR/server-timing/) to every tree view response, ie:
+            Server-Timing: resolve;dur=0.021, preprocess;desc="books/";dur=0.310, handler;desc="books/int__/";dur=2.145
+        Durations are in milliseconds. There is one "preprocess" entry per node (with a preprocess() function) in the branch.
+    '''
+    global _server_timing
+    _server_timing = enable
+    _update_enabled()
+
+def record_resolve(view_tree_path, seconds):
+    _last_resolve.set((view_tree_path, seconds))
+    for observer in _observers :
+        observer('resolve', view_tree_path, seconds)
+
+class RequestTimer:
+    '''
+        Collects the timings of a single request (see view._view()), passes them on to observers, and builds the Server-Timing header.
+        Steps may be timed concurrently (see PreprocessPlan), so begin() returns the start time, for end().
+    '''
+    __slots__ = ('entries',)
+
+    def __init__(self):
+        self.entries = []
+        resolved = _last_resolve.get()
+        if resolved is not None :
+            _last_resolve.set(None)
+            self.entries.append(('resolve', resolved[0], resolved[1]))
+
+    def begin(self):
+        return perf_counter()
+
+    def end(self, phase, view_tree_path, start):
+        seconds = perf_counter() - start
+        self.entries.append((phase, view_tree_path, seconds))
+        for observer in _observers :
+            observer(phase, view_tree_path, seconds)
+
+    def add_header(self, response):
+        if not _server_timing :
+            return
+        if hasattr(response, 'render') and callable(response.render) and not response.is_rendered :
+            # Note - the response cache stores TemplateResponses once rendered, and this request's timings mustn't be stored with them
+            response.add_post_render_callback(self._set_header)
+        else :
+            self._set_header(response)
+
+    def _set_header(self, response):
+        metrics = []
+        for phase, view_tree_path, seconds in self.entries :
+            if phase == 'resolve' :
+                # The request path already says what was resolved
+                metrics.append(f'{phase};dur={seconds*1000:.3f}')
+            else :
+                metrics.append(f'{phase};desc="{view_tree_path}";dur={seconds*1000:.3f}')
+        existing = response.get('Server-Timing')
+        if existing :
+            metrics.insert(0, existing)
+        response['Server-Timing'] = ', '.join(metrics)
+
+class LatencyHistogram:
+    '''
+        Fixed, exponentially sized buckets (in seconds), so recording is cheap and memory use is constant.
+
+        self.counts[i] is the number of samples <= self.bounds[i] (and > self.bounds[i-1]).
+        The last bucket has no upper bound.
+    '''
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    # 10µs up to ~42s, doubling
+    bounds = tuple(0.00001 * 2**i for i in range(23)) + (float('inf'),)
+
+    def __init__(self):
+        self.counts = [0] * len(self.bounds)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max :
+            self.max = seconds
+
+    def percentile(self, p):
+        '''
+            Return an upper bound for the p-th percentile (0 < p <= 100), accurate to within a factor of 2.
+            Returns None if there are no samples.
+        '''
+        if not self.count :
+            return None
+        rank = self.count * p / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts) :
+            seen += count
+            if seen >= rank :
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return dict(
+            count=self.count,
+            mean=self.total / self.count if self.count else None,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            max=self.max,
+        )
+
+class TimingHistograms:
+    '''
+        A timing observer which aggregates a LatencyHistogram per (view_tree_path, phase), in-process.
+
+        Usage:
+            histograms = TimingHistograms()
+            add_timing_observer(histograms)
+            ...
+            histograms.summary() # -> {view_tree_path: {phase: {count, mean, p50, p90, p99, max}}}
+    '''
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, phase, view_tree_path, seconds):
+        key = (view_tree_path, phase)
+        with self._lock :
+            histogram = self.histograms.get(key)
+            if histogram is None :
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def get(self, view_tree_path, phase):
+        '''Return the LatencyHistogram for view_tree_path and phase, or None'''
+        return self.histograms.get((view_tree_path, phase))
+
+    def summary(self):
+        with self._lock :
+            result = {}
+            for (view_tree_path, phase), histogram in self.histograms.items() :
+                result.setdefault(view_tree_path, {})[phase] = histogram.summary()
+            return result
+
+    def clear(self):
+        with self._lock :
+            self.histograms.clear()
@@ -0,0 +1,66 @@
+'''
+urlconf.py
+
+Helpers for finding the tree views in a urlconf.
+'''
+from functools import lru_cache
+
+from django.urls import get_resolver, NoReverseMatch, URLResolver
+from django.urls.resolvers import RegexPattern, RoutePattern
+from django.utils.regex_helper import normalize
+from django_dynamic_path import DynamicPath
+
+# Note - path_resolver imports reverse, which imports us
+from . import path_resolver
+
+def iter_path_resolvers(urlconf=None):
+    '''Yield the PathResolver of every tree view in urlconf (default: settings.ROOT_URLCONF)'''
+    for prefix, resolver in iter_tree_views(urlconf) :
+        yield resolver
+
+def iter_tree_views(urlconf=None):
+    '''
+        Yield (prefix, PathResolver) for every tree view in urlconf (default: settings.ROOT_URLCONF).
+
+        prefix is the url prefix the tree view is include()-ed under, without the leading '/'.
+        prefix is None if any of the enclosing patterns capture arguments (or can't otherwise be reversed to a fixed string).
+    '''
+    yield from _iter_tree_views(get_resolver(urlconf).url_patterns, '')
+def _iter_tree_views(patterns, prefix):
+    for pattern in patterns :
+        if isinstance(pattern, URLResolver) :
+            literal = _literal_prefix(pattern.pattern)
+            yield from _iter_tree_views(
+                pattern.url_patterns,
+                None if prefix is None or literal is None else prefix + literal,
+            )
+        elif isinstance(pattern, DynamicPath) and isinstance(pattern.resolver_func, path_resolver.MergedPathResolver) :
+            for mount_prefix, resolver in pattern.resolver_func.resolvers :
+                yield None if prefix is None else prefix + mount_prefix, resolver
+        elif isinstance(pattern, DynamicPath) and isinstance(pattern.resolver_func, path_resolver.PathResolver) :
+            yield prefix, pattern.resolver_func
+
+@lru_cache(maxsize=32)
+def find_tree_view(url_resolver, root_module_name):
+    '''
+        Return (prefix, PathResolver) for the tree view whose root is root_module_name (or the first tree view, if root_module_name is None), in url_resolver's urlconf.
+        Raises NoReverseMatch if there isn't one, or its prefix isn't fixed (see iter_tree_views()).
+    '''
+    # Note - get_resolver() returns a new URLResolver whenever the url caches are cleared (ie. ROOT_URLCONF changed), so we're keyed on that
+    for prefix, resolver in iter_tree_views(url_resolver.urlconf_name) :
+        if root_module_name is None or resolver.root_module_name == root_module_name :
+            if prefix is None :
+                raise NoReverseMatch(f'Tree view {resolver.root_module_name!r} is included under a pattern which captures arguments')
+            return prefix, resolver
+    raise NoReverseMatch(f'No tree view for {root_module_name!r}' if root_module_name else 'No tree views in urlconf')
+
+def _literal_prefix(pattern):
+    if not isinstance(pattern, (RoutePattern, RegexPattern)) :
+        return None
+    candidates = normalize(pattern.regex.pattern)
+    if len(candidates) != 1 :
+        return None
+    literal, params = candidates[0]
+    if params :
+        return None
+    return literal
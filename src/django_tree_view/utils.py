@@ -1,27 +1,87 @@
 import re
 
-# adapated from https://gist.github.com/carlsmith/b2e6ba538ca6f58689b4c18f46fef11c
-def _simultaneous_replace(string, substitutions, reverse=False):
-    if reverse :
-        return _simultaneous_replace(string, dict(
-            (v,k) for k, v in substitutions.items()
-        ))
-    substrings = sorted(substitutions, key=len, reverse=True)
-    regex = re.compile('|'.join(map(re.escape, substrings)))
-    return regex.sub(lambda match: substitutions[match.group(0)], string)
+class PathCodec:
+    '''
+        Simultaneously replaces substrings (ie. "a->b, b->c" does not turn "a" into "c"), in a single pass, with precompiled regexes.
+
+        substitutions must be reversible, and the first character of every replacement must itself be substituted (ie. be an "escape" character).
+        That guarantees escape characters never appear alone in encoded strings, which lets decode(strict=True) detect malformed input.
+        decode(strict=True) also rejects any other substituted string (ie. '/'), which encode() never emits.
+    '''
+    def __init__(self, substitutions):
+        self._encode_map = dict(substitutions)
+        self._decode_map = {v: k for k, v in self._encode_map.items()}
+        if len(self._decode_map) != len(self._encode_map) :
+            raise ValueError('substitutions must be reversible')
+        escapes = {v[0] for v in self._decode_map}
+        if not escapes <= set(self._encode_map) :
+            raise ValueError('the first character of every replacement must also be substituted')
+
+        # str.translate() is much faster than a regex, but only works when every substituted string is a single character
+        self._encode_table = str.maketrans(self._encode_map) if all(len(k) == 1 for k in self._encode_map) else None
+        self._encode_sub = _alternation(self._encode_map).sub
+        self._decode_sub = _alternation(self._decode_map).sub
+        # Any substituted string (ie. '/', or a lone escape character) is malformed, unless it's part of a replacement
+        # Note - replacements are tried first, so these only match when they aren't
+        self._strict_decode_sub = _alternation(list(self._decode_map) + sorted(set(self._encode_map) - set(self._decode_map))).sub
+
+        encode_map = self._encode_map
+        decode_map = self._decode_map
+        self._encode_match = lambda match: encode_map[match[0]]
+        self._decode_match = lambda match: decode_map[match[0]]
+
+    def encode(self, path):
+        if self._encode_table is not None :
+            return path.translate(self._encode_table)
+        return self._encode_sub(self._encode_match, path)
+
+    def decode(self, path, strict=False):
+        '''
+            If strict, raise ValueError if path could not have been produced by encode().
+            Otherwise, unrecognized sequences are passed through as is.
+        '''
+        if not strict :
+            return self._decode_sub(self._decode_match, path)
+        try :
+            return self._strict_decode_sub(self._decode_match, path)
+        except KeyError :
+            raise ValueError(f'Malformed encoded path: {path!r}') from None
+
+    def encode_many(self, paths):
+        '''Generator version of encode(), for an iterable of paths'''
+        encode = self.encode
+        for path in paths :
+            yield encode(path)
+
+    def decode_many(self, paths, strict=False):
+        '''Generator version of decode(), for an iterable of paths'''
+        for path in paths :
+            yield self.decode(path, strict)
+
+def _alternation(substrings):
+    # Longest first, so that the regex prefers longer matches
+    substrings = sorted(substrings, key=len, reverse=True)
+    return re.compile('|'.join(map(re.escape, substrings)))
+
 _PATH_REPLACEMENTS = {
     '/': '_-',
     '_': '__',
 }
+path_codec = PathCodec(_PATH_REPLACEMENTS)
+
 def encode_path(path):
     '''
         Encode a url path so that is has no '/' characters, and can be used as a single segment in the path of another url.
 
         Note that standard url-encoding (replacing '/' with '%2F') won't work, because Django (or is it Apache?) decodes these into '/' before passing off to the url matching machinery.
+
+        See path_codec.encode_many() to encode many paths.
     '''
-    return _simultaneous_replace(path, _PATH_REPLACEMENTS)
-def decode_path(path):
+    return path_codec.encode(path)
+def decode_path(path, strict=False):
     '''
         Inverse operation of encode_path()
+
+        If strict, raise ValueError if path is not a valid encoded path (by default, invalid sequences are left as is).
     '''
-    return _simultaneous_replace(path, _PATH_REPLACEMENTS, reverse=True)
\ No newline at end of file
+    return path_codec.decode(path, strict)
@@ -1,81 +1,399 @@
-import functools
-import os
+import datetime
+from inspect import iscoroutinefunction
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django import http
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.urls import resolve, Resolver404
 from django_early_return import EarlyReturn
 from django.views.decorators.csrf import csrf_exempt
 
 import django_referer_csrf
 
-http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options', 'trace']
+from . import loading, preload, timing
+from .node_dispatch import http_method_names
+from .preprocess_cache import PreprocessCache
+from .preprocess_graph import PreprocessPlan
 
-def preprocess(request, handlers):
-    branch_data = {}
+def preprocess(request, handlers, timer=None):
+    loading.prefetch(request, handlers)
+    # Run independent steps concurrently, if any nodes declare NEEDS/PRODUCES
+    plan = PreprocessPlan.for_handlers(handlers)
+    if plan is not None :
+        return plan.run({}, request, handlers, timer)
+    if timer is not None :
+        # Time each step (see timing.py)
+        return _timed_preprocess_into({}, request, handlers, timer)
+    return _preprocess_into({}, request, handlers)
+
+def _preprocess_into(branch_data, request, handlers):
     for node, arg in handlers :
-        try :
-            p = getattr(node.module, 'preprocess')
-        except AttributeError :
-            # Modules don't have to implement preprocess()
+        dispatch = node.dispatch
+        p = dispatch.preprocess
+        # Modules don't have to implement preprocess()
+        if p is None :
             continue
+        if dispatch.preprocess_is_async :
+            p = async_to_sync(p)
 
         # Not all modules capture an arg from the url
-        args = [arg] if arg is not None else []
-
-        r = p(request, *args, **branch_data)
+        if arg is None :
+            r = p(request, **branch_data)
+        else :
+            r = p(request, arg, **branch_data)
         # preprocess can return a dictionary to be merged into the "branch data"
         if r :
             branch_data.update(r)
 
     return branch_data
 
+def _timed_preprocess_into(branch_data, request, handlers, timer):
+    for node, arg in handlers :
+        if node.dispatch.preprocess is None :
+            continue
+        start = timer.begin()
+        try :
+            _preprocess_into(branch_data, request, ((node, arg),))
+        finally :
+            timer.end('preprocess', node.view_tree_path, start)
+    return branch_data
+
+def memoized_preprocess(request, handlers):
+    '''
+        Same as preprocess(), but reuses results from previous calls for the same request (see PreprocessCache).
+        Counters are available from PreprocessCache.for_request(request).
+        Note - steps always run sequentially here (NEEDS/PRODUCES are ignored), since each result is cached separately.
+    '''
+    handlers = tuple(handlers)
+    cache = PreprocessCache.for_request(request)
+    start, limit, branch_data = cache.resume(handlers)
+    if start < len(handlers) :
+        loading.prefetch(request, handlers)
+    for i in range(start, len(handlers)) :
+        node, arg = handlers[i]
+        dispatch = node.dispatch
+        p = dispatch.preprocess
+        if p is None :
+            continue
+        if dispatch.preprocess_is_async :
+            p = async_to_sync(p)
+
+        cache.calls += 1
+        try :
+            if arg is None :
+                r = p(request, **branch_data)
+            else :
+                r = p(request, arg, **branch_data)
+        except cache.cached_exceptions as e :
+            if i < limit :
+                cache.record_exception(handlers, i, e)
+            raise
+        if r :
+            branch_data.update(r)
+        if i < limit :
+            cache.record(handlers, i, branch_data)
+
+    return branch_data
+
+async def async_preprocess(request, handlers, timer=None):
+    '''
+        Same as preprocess(), but awaits async preprocess functions directly.
+        Consecutive sync preprocess functions are run together, in a single sync_to_async() call.
+        Independent steps run as concurrent tasks (see PreprocessPlan).
+    '''
+    if loading.has_chains(handlers) :
+        await sync_to_async(loading.prefetch)(request, handlers)
+    plan = PreprocessPlan.for_handlers(handlers)
+    if plan is not None :
+        return await plan.async_run({}, request, handlers, timer)
+    if timer is not None :
+        return await _timed_async_preprocess_into({}, request, handlers, timer)
+    return await _async_preprocess_into({}, request, handlers)
+
+async def _async_preprocess_into(branch_data, request, handlers):
+    pending_sync = []
+    for node, arg in handlers :
+        dispatch = node.dispatch
+        p = dispatch.preprocess
+        if p is None :
+            continue
+        if not dispatch.preprocess_is_async :
+            pending_sync.append((node, arg))
+            continue
+
+        if pending_sync :
+            await sync_to_async(_preprocess_into)(branch_data, request, pending_sync)
+            pending_sync = []
+        if arg is None :
+            r = await p(request, **branch_data)
+        else :
+            r = await p(request, arg, **branch_data)
+        if r :
+            branch_data.update(r)
+
+    if pending_sync :
+        await sync_to_async(_preprocess_into)(branch_data, request, pending_sync)
+    return branch_data
+
+async def _timed_async_preprocess_into(branch_data, request, handlers, timer):
+    '''
+        Note - sync preprocess functions are each run in their own sync_to_async() call (so that they can be timed individually), rather than batched.
+    '''
+    for node, arg in handlers :
+        if node.dispatch.preprocess is None :
+            continue
+        start = timer.begin()
+        try :
+            await _async_preprocess_into(branch_data, request, ((node, arg),))
+        finally :
+            timer.end('preprocess', node.view_tree_path, start)
+    return branch_data
+
 '''
     Note - we mark the view as csrf_exempt, and then provide our own CSRF protection.
     This is so that users can turn CSRF protection off for particular endpoints.
 '''
 @csrf_exempt
 def view(request, *handlers):
+    handler_func, response = _get_handler_func(request, handlers)
+    if response is not None :
+        return response
+
+    # Add the branch's preload hints (see preload.py)
+    link_header = preload.get_link_header(handlers)
+    if link_header is None :
+        return _view(request, handlers, handler_func)
+    preload.send_early_hints(request, link_header)
+    return preload.add_link_header(_view(request, handlers, handler_func), link_header)
+
+def _view(request, handlers, handler_func):
+    '''The rest of view(), once we know the request will be handled'''
+    # Run all preprocess functions
+    '''
+        Note - we expect you to perform any required authentication in your preprocess functions.
+        If authentication fails, we recommend raising a django_early_return.EarlyReturn exception.
+        That way you can use our is_get_allowed(path, user) helper method to determine if a given user is currently allowed to access a given path.
+    '''
+    timer = timing.RequestTimer() if timing.enabled else None
+    cache_policy = handlers[-1][0].dispatch.cache
+    if cache_policy is not None and request.method in ('GET', 'HEAD') and cache_policy.applies(request) :
+        response = _cached_view(request, handlers, handler_func, cache_policy, timer)
+    else :
+        branch_data = preprocess(request, handlers, timer)
+
+        # Run the view
+        response = _timed_call_handler(request, handlers, handler_func, branch_data, timer)
+    if timer is not None :
+        timer.add_header(response)
+    return response
+
+    # TODO:
+    # Should we allow modules to implement a postprocess(response, request), which runs in reverse order? This could be used, for example, to set response headers for an entire branch
+
+async def async_view(request, *handlers):
+    '''
+        Async version of view(), for use under ASGI (see make_tree_view(async_view=True)).
+
+        async preprocess() and handler functions are awaited directly.
+        If no module in the branch defines any async functions, we run view() in a single sync_to_async() call, exactly as Django would for a sync view.
+    '''
+    if not any(node.dispatch.is_async for node, arg in handlers) :
+        return await sync_to_async(view)(request, *handlers)
+    # Django's cache API is sync - let view() handle cached nodes
+    if handlers[-1][0].dispatch.cache is not None and request.method in ('GET', 'HEAD') :
+        return await sync_to_async(view)(request, *handlers)
+
+    handler_func, response = _get_handler_func(request, handlers)
+    if response is not None :
+        return response
+
+    link_header = preload.get_link_header(handlers)
+    if link_header is None :
+        return await _async_view(request, handlers, handler_func)
+    preload.send_early_hints(request, link_header)
+    return preload.add_link_header(await _async_view(request, handlers, handler_func), link_header)
+# Note - django's csrf_exempt() doesn't support async views before Django 5
+async_view.csrf_exempt = True
+
+async def _async_view(request, handlers, handler_func):
+    '''The rest of async_view(), once we know the request will be handled'''
+    timer = timing.RequestTimer() if timing.enabled else None
+    branch_data = await async_preprocess(request, handlers, timer)
+
+    handler_node = handlers[-1][0]
+    if timer is None :
+        return await _async_call_handler(request, handler_node.dispatch, handler_func, branch_data)
+    start = timer.begin()
+    try :
+        response = await _async_call_handler(request, handler_node.dispatch, handler_func, branch_data)
+    finally :
+        timer.end('handler', handler_node.view_tree_path, start)
+    timer.add_header(response)
+    return response
+
+def _cached_view(request, handlers, handler_func, cache_policy, timer):
+    '''
+        Same as the rest of view(), but serves/stores the response with cache_policy (see response_cache.py).
+        Unless the policy is public, preprocess() runs first, so that cached responses are only served to authorized requests.
+    '''
+    if not cache_policy.public :
+        branch_data = preprocess(request, handlers, timer)
+    key = cache_policy.get_key(request, handlers)
+    response = cache_policy.get(key)
+    if response is not None :
+        return _not_modified_from_cached(request, response) or response
+    if cache_policy.public :
+        branch_data = preprocess(request, handlers, timer)
+
+    response = _timed_call_handler(request, handlers, handler_func, branch_data, timer)
+    # Note - GET and HEAD share keys, and a module's own head() may not return a body, so only GET responses are stored
+    if request.method == 'GET' :
+        cache_policy.store(key, response, request)
+    return response
+
+def _timed_call_handler(request, handlers, handler_func, branch_data, timer):
+    '''_call_handler(), timed if timer isn't None (see timing.py)'''
+    handler_node = handlers[-1][0]
+    if timer is None :
+        return _call_handler(request, handler_node.dispatch, handler_func, branch_data)
+    start = timer.begin()
+    try :
+        return _call_handler(request, handler_node.dispatch, handler_func, branch_data)
+    finally :
+        timer.end('handler', handler_node.view_tree_path, start)
+
+def _call_handler(request, dispatch, handler_func, branch_data):
+    '''
+        Run the handler, unless the node's etag()/last_modified() show that the client's copy is current (see NodeDispatch.conditional).
+    '''
+    if dispatch.conditional and request.method in ('GET', 'HEAD') :
+        etag, last_modified = _get_validators(request, dispatch, branch_data)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None :
+            response = _call_handler_func(request, dispatch, handler_func, branch_data)
+        return _add_validators(response, etag, last_modified)
+    return _call_handler_func(request, dispatch, handler_func, branch_data)
+
+def _call_handler_func(request, dispatch, handler_func, branch_data):
+    method = request.method.lower()
+    if method in dispatch.async_methods :
+        r = async_to_sync(handler_func)(request, **branch_data)
+    else :
+        r = handler_func(request, **branch_data)
+    if method in dispatch.streaming_methods :
+        return _streaming_response(request, dispatch, r)
+    return r
+
+async def _async_call_handler(request, dispatch, handler_func, branch_data):
+    '''Async version of _call_handler()'''
+    if dispatch.conditional and request.method in ('GET', 'HEAD') :
+        etag, last_modified = await sync_to_async(_get_validators)(request, dispatch, branch_data)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None :
+            response = await _async_call_handler_func(request, dispatch, handler_func, branch_data)
+        return _add_validators(response, etag, last_modified)
+    return await _async_call_handler_func(request, dispatch, handler_func, branch_data)
+
+async def _async_call_handler_func(request, dispatch, handler_func, branch_data):
+    method = request.method.lower()
+    if method in dispatch.async_methods :
+        r = await handler_func(request, **branch_data)
+    else :
+        r = await sync_to_async(handler_func)(request, **branch_data)
+    if method in dispatch.streaming_methods :
+        return _streaming_response(request, dispatch, r)
+    return r
+
+def _streaming_response(request, dispatch, content):
+    '''
+        Wrap the result of a streaming handler (ie. a generator) in a StreamingHttpResponse (see NodeDispatch.streaming_methods).
+        If the handler returned a response itself (ie. an error), it's returned as is.
+
+        HEAD requests handled by the get handler get an empty body, so the handler's result is never iterated.
+    '''
+    if isinstance(content, http.HttpResponseBase) :
+        return content
+    if request.method == 'HEAD' and 'head' not in dispatch.allowed_methods :
+        # Note - async generators which haven't started don't need closing
+        close = getattr(content, 'close', None)
+        if close is not None :
+            close()
+        content = ()
+    if dispatch.streaming_content_type is None :
+        return http.StreamingHttpResponse(content)
+    return http.StreamingHttpResponse(content, content_type=dispatch.streaming_content_type)
+
+def _get_validators(request, dispatch, branch_data):
+    '''
+        Returns (etag, last_modified), as expected by django's get_conditional_response().
+        Same rules as django's condition() decorator - etag() may return a quoted or unquoted etag, last_modified() a naive (UTC) or aware datetime.
+    '''
+    etag = last_modified = None
+    if dispatch.etag is not None :
+        f = async_to_sync(dispatch.etag) if iscoroutinefunction(dispatch.etag) else dispatch.etag
+        etag = f(request, **branch_data)
+        if etag is not None :
+            etag = quote_etag(etag)
+    if dispatch.last_modified is not None :
+        f = async_to_sync(dispatch.last_modified) if iscoroutinefunction(dispatch.last_modified) else dispatch.last_modified
+        dt = f(request, **branch_data)
+        if dt is not None :
+            if not timezone.is_aware(dt) :
+                dt = timezone.make_aware(dt, datetime.timezone.utc)
+            last_modified = int(dt.timestamp())
+    return etag, last_modified
+
+def _add_validators(response, etag, last_modified):
+    if last_modified and not response.has_header('Last-Modified') :
+        response['Last-Modified'] = http_date(last_modified)
+    if etag and not response.has_header('ETag') :
+        response['ETag'] = etag
+    return response
+
+def _not_modified_from_cached(request, response):
+    '''Return a 304 (or 412) response if the validators of a cached response satisfy the request's conditional headers, else None'''
+    etag = response.get('ETag')
+    last_modified = response.get('Last-Modified')
+    if etag is None and last_modified is None :
+        return None
+    if last_modified is not None :
+        last_modified = parse_http_date_safe(last_modified)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+def _get_handler_func(request, handlers):
+    '''
+        Returns (handler_func, None), or (None, response) if the request should not be handled.
+        Also sets request.view_tree_dir and request.view_tree_path.
+    '''
     method = request.method.lower()
     handler_node = handlers[-1][0]
-    handler_module = handler_node.module
+    dispatch = handler_node.dispatch
 
     # Apply CSRF protection, unless the handler module has set CSRF_EXEMPT=True 
-    if not getattr(handler_module, 'CSRF_EXEMPT', False) :
+    if not dispatch.csrf_exempt :
         if not django_referer_csrf.is_valid(request) :
-            return http.HttpResponseForbidden('CSRF check failed.')
-
-    if method not in http_method_names :
-        return _method_not_allowed(request, handler_module)
+            return None, http.HttpResponseForbidden('CSRF check failed.')
 
-    try :
-        handler_func = _get_handler_func(handler_module, method)
-    except AttributeError :
+    # Note - this also rejects any method not in http_method_names
+    handler_func = dispatch.handlers.get(method)
+    if handler_func is None :
         if method == 'options' :
             # provide default options implementation
-            return _options(request, handler_module)
-        return _method_not_allowed(request, handler_module)
+            return None, _options(request, dispatch)
+        return None, _method_not_allowed(request, dispatch)
 
     # We recommend storing templates in same directory as the handler module.
     # You'll then want to put the root directory of your tree view in your template DIRS
     # This property enables you to prepend the appropriate path to a template name (relative to the root of your tree view).
     # This will either be empty string (for the root of the view tree) or end in '/'
-    request.view_tree_dir = os.path.join(handler_node.view_tree_path, '')
+    request.view_tree_dir = handler_node.view_tree_dir
 
     # Include this, directly, for backward compatibility
     request.view_tree_path = handler_node.view_tree_path
 
-    # Run all preprocess functions
-    '''
-        Note - we expect you to perform any required authentication in your preprocess functions.
-        If authentication fails, we recommend raising a django_early_return.EarlyReturn exception.
-        That way you can use our is_get_allowed(path, user) helper method to determine if a given user is currently allowed to access a given path.
-    '''
-    branch_data = preprocess(request, handlers)
-
-    # Run the view
-    return handler_func(request, **branch_data)
-
-    # TODO:
-    # Should we allow modules to implement a postprocess(response, request), which runs in reverse order? This could be used, for example, to set response headers for an entire branch
+    return handler_func, None
 
 '''
     Add a special "test_page_visibility" property to the view
@@ -83,33 +401,45 @@ def view(request, *handlers):
 
     This function should raise an exception if the user is not currently allowed to view the page.
     Note that our implemenation of this requires users to all of their permission checks inside preprocess() functions.
+
+    Pages often check visibility for many urls in the same branch, so we memoize preprocess() results for the duration of the request.
 '''
 def test_page_visibility(request, *handlers):
-    preprocess(request, handlers)
+    memoized_preprocess(request, handlers)
     return True
 view.test_page_visibility = test_page_visibility
+async_view.test_page_visibility = test_page_visibility
 
-def _get_handler_func(handler_module, method):
-    '''Get final handler function, or raise raise AttributeError'''
-    try :
-        return getattr(handler_module, method)
-    except AttributeError :
-        pass
-
-    if method == 'head' :
-        return getattr(handler_module, 'get')
+def bulk_test_page_visibility(request, paths, urlconf=None):
+    '''
+        Returns a dict mapping each of paths -> True if the user may currently view the page, False otherwise.
 
-    raise AttributeError()
+        Paths are resolved with django's resolve() (so they should start with '/'), and all tree view paths are preprocessed with a shared PreprocessCache, so each common ancestor's preprocess() runs only once.
+        A preprocess() raising EarlyReturn (or PermissionDenied/Http404) means denied.
+        Paths which don't resolve, or whose node has no get() handler (so GET would answer 405), are denied. Paths which resolve to some other view are allowed (we have no way to check them).
+    '''
+    visibility = {}
+    for path in paths :
+        try :
+            match = resolve(path, urlconf)
+        except Resolver404 :
+            visibility[path] = False
+            continue
+        if match.func is not view and match.func is not async_view :
+            visibility[path] = True
+            continue
+        try :
+            memoized_preprocess(request, match.args)
+        except PreprocessCache.cached_exceptions :
+            visibility[path] = False
+        else :
+            visibility[path] = 'get' in match.args[-1][0].dispatch.handlers
+    return visibility
 
-def _method_not_allowed(request, handler_module):
-    return http.HttpResponseNotAllowed(_allowed_methods(handler_module))
-def _options(request, handler_module):
+def _method_not_allowed(request, dispatch):
+    return http.HttpResponseNotAllowed(dispatch.allowed_methods)
+def _options(request, dispatch):
     response = http.HttpResponse()
-    response['Allow'] = ', '.join(_allowed_methods(handler_module))
+    response['Allow'] = dispatch.allow
     response['Content-Length'] = '0'
-    return response
-def _allowed_methods(handler_module):
-    methods = [m for m in http_method_names if hasattr(handler_module, m)]
-    if 'options' not in methods :
-        methods.append('options')
-    return methods
\ No newline at end of file
+    return response
\ No newline at end of file
@@ -3,12 +3,19 @@ module_tree.py
 
 Implements ModuleTree -> a class which walks a python package, creating an easy-to-traverse tree structure.
 '''
-from importlib import import_module
+from importlib import import_module, invalidate_caches
+import os
 from os import path
 from pathlib import Path
+import sys
 
-class ConfigurationError(Exception):
-    pass
+from .converters import get_converter
+from .exceptions import ConfigurationError
+from .manifest import default_manifest_path, read_fresh_manifest, write_manifest
+from .node_dispatch import NodeDispatch
+
+# Placeholder for ViewTreeNode._module, in lazy trees, until the module is first accessed
+_NOT_IMPORTED = object()
 
 class ViewTreeNode:
     '''
@@ -16,34 +23,181 @@ class ViewTreeNode:
 
         self.view_tree_path
             the path of this directory, relative to the root of the view tree
+        self.view_tree_dir
+            same, but either empty string (for the root of the view tree) or ending in '/'
         self.module
             the view_tree_node.py module
             will be None if this module does not have a view_tree_node.py file
+            if lazy, the module is imported on first access (and any ImportError is raised then)
         self.subtrees
             a dictionary of ViewTreeNodes representing subtrees of this one
+        self.mtime
+            modification time of this directory, when it was last scanned (see refresh())
+        self.dispatch
+            a NodeDispatch, built from self.module on first access
     '''
-    def __init__(self, view_tree_path, package_name, package_path):
+    __slots__ = ('view_tree_path', 'view_tree_dir', 'package_name', 'package_path', 'lazy', 'mtime', 'subtrees', '_module', '_dispatch')
+
+    def __init__(self, view_tree_path, package_name, package_path, lazy=False, manifest_entry=None):
+        '''
+            manifest_entry, if given, is this node's entry from a (fresh) manifest, which is used instead of scanning the directory
+        '''
         self.view_tree_path = view_tree_path
+        self.view_tree_dir = path.join(view_tree_path, '')
+        self.package_name = package_name
+        self.package_path = package_path
+        self.lazy = lazy
+        self._load(manifest_entry)
+
+    @property
+    def module(self):
+        module = self._module
+        if module is _NOT_IMPORTED :
+            module = self._module = self._import_module()
+        return module
+
+    @property
+    def dispatch(self):
+        dispatch = self._dispatch
+        if dispatch is None :
+            name = path.basename(self.view_tree_path)
+            captures = name == 'path__' or get_converter(name) is not None
+            dispatch = self._dispatch = NodeDispatch(self.module, captures)
+        return dispatch
+
+    def warm(self):
+        '''Import the modules of this node and all of its descendants (useful with lazy trees, ie. before forking worker processes)'''
+        self.module
+        for subtree in self.subtrees.values() :
+            subtree.warm()
+
+    def _load(self, manifest_entry=None):
+        self._dispatch = None
+        if manifest_entry is not None :
+            self.mtime = manifest_entry['mtime']
+            # No need to even attempt an import, if there is no view_tree_node.py
+            if not manifest_entry['module'] :
+                self._module = None
+            else :
+                self._module = _NOT_IMPORTED if self.lazy else self._import_module()
+            self.subtrees = {
+                name: self._make_subtree(name, self.package_path / name, subtree_entry)
+                for name, subtree_entry in manifest_entry['subtrees'].items()
+            }
+            return
+
+        # Note - read mtime before scanning, so that any change made during the scan is picked up by the next refresh()
+        self.mtime = _mtime(self.package_path)
+        self._module = _NOT_IMPORTED if self.lazy else self._import_module()
+        self.subtrees = {
+            name: self._make_subtree(name, subdir)
+            for name, subdir in self._scan_subdirectories()
+        }
 
-        import_name = package_name +'.view_tree_node'
+    def _import_module(self):
+        import_name = self.package_name +'.view_tree_node'
         try :
-            self.module = import_module(import_name)
+            return import_module(import_name)
         except ModuleNotFoundError as e :
             if e.name != import_name :
                 raise e
-            self.module = None
+            return None
 
-        self.subtrees = {
-            subdir.name: ViewTreeNode(
-                path.join(view_tree_path, subdir.name), 
-                f'{package_name}.{subdir.name}', 
-                subdir,
-            )
-            # Note - pretty well any directory name can be imported dynamically with import_module, but directories containing '.' cannot, because a.b is treated as a/b by the import system
-            # Also exclude any directory beginning with '__' -> mainly to exclude __pycache__ directory
-            for subdir in package_path.iterdir() 
-            if subdir.is_dir() and not '.' in subdir.name and not subdir.name.startswith('__')
-        }
+    def _scan_subdirectories(self):
+        # Note - scandir() can usually tell us whether an entry is a directory without an extra stat() call
+        with os.scandir(self.package_path) as entries :
+            return [
+                (entry.name, self.package_path / entry.name)
+                # Note - pretty well any directory name can be imported dynamically with import_module, but directories containing '.' cannot, because a.b is treated as a/b by the import system
+                # Also exclude any directory beginning with '__' -> mainly to exclude __pycache__ directory
+                for entry in entries
+                if not '.' in entry.name and not entry.name.startswith('__') and entry.is_dir()
+            ]
+
+    def _make_subtree(self, name, subdir, manifest_entry=None):
+        return ViewTreeNode(
+            path.join(self.view_tree_path, name), 
+            f'{self.package_name}.{name}', 
+            subdir,
+            self.lazy,
+            manifest_entry,
+        )
+
+    def is_stale(self):
+        '''True if this directory has changed (or been deleted) since it was last scanned'''
+        return _mtime(self.package_path) != self.mtime
+
+    def refresh(self):
+        '''
+            Bring this subtree up to date with the file system, and return True if anything changed.
+
+            Only directories whose mtime changed are rescanned. Adding/removing a file or directory changes the mtime of the containing directory, so this catches:
+                - added and deleted subdirectories
+                - added and deleted view_tree_node.py modules
+                - __init__.py added to (or removed from) a directory which was already imported as a namespace package (or vice versa)
+            Unchanged nodes (and their modules) are kept as is.
+        '''
+        mtime = _mtime(self.package_path)
+        if mtime is None :
+            # Directory was deleted - our parent will drop us when it rescans
+            return True
+
+        changed = False
+        if mtime != self.mtime :
+            invalidate_caches()
+            if _package_type_changed(self.package_name, self.package_path) :
+                _purge_modules(self.package_name)
+                self._load()
+                return True
+
+            self.mtime = mtime
+            module = self._module
+            if module is not None and module is not _NOT_IMPORTED and not path.exists(module.__file__) :
+                _purge_modules(module.__name__)
+                self._module = None
+                self._dispatch = None
+                changed = True
+            elif module is None :
+                self._module = _NOT_IMPORTED if self.lazy else self._import_module()
+                self._dispatch = None
+                changed = self._module is not None
+
+            subdirectories = dict(self._scan_subdirectories())
+            for name in list(self.subtrees) :
+                if name not in subdirectories :
+                    _purge_modules(self.subtrees.pop(name).package_name)
+                    changed = True
+            for name, subdir in subdirectories.items() :
+                if name not in self.subtrees :
+                    self.subtrees[name] = self._make_subtree(name, subdir)
+                    changed = True
+
+        for subtree in list(self.subtrees.values()) :
+            # Note - newly created subtrees are up to date, and will return False
+            if subtree.refresh() :
+                changed = True
+
+        return changed
+
+def _mtime(directory):
+    try :
+        return directory.stat().st_mtime_ns
+    except FileNotFoundError :
+        return None
+
+def _package_type_changed(package_name, package_path):
+    '''True if package was imported as a namespace package, but now has __init__.py (or vice versa)'''
+    package = sys.modules.get(package_name)
+    if package is None :
+        return False
+    is_namespace_package = getattr(package, '__file__', None) is None
+    return is_namespace_package == (package_path / '__init__.py').exists()
+
+def _purge_modules(name):
+    '''Remove module name, and all of its submodules, from sys.modules, so they will be imported fresh'''
+    prefix = name + '.'
+    for module_name in [n for n in sys.modules if n == name or n.startswith(prefix)] :
+        del sys.modules[module_name]
 
 def _get_valid_package_directory(module):
     try :
@@ -58,10 +212,32 @@ def _get_valid_package_directory(module):
     return p.parent
 
 class ViewTree(ViewTreeNode):
-    def __init__(self, package_name):
+    '''
+        If manifest is given (a file path, or True for the default location - see manifest.default_manifest_path()), the tree structure is loaded from that manifest, rather than by walking the directories.
+        If the manifest is missing or out of date, we fall back to walking the directories.
+
+        self.from_manifest
+            True if the tree was loaded from the manifest
+    '''
+    __slots__ = ('from_manifest',)
+
+    def __init__(self, package_name, lazy=False, manifest=None):
         # Note - if import error occurs, that should be pretty self-explanatory to the user - no custom message needed
         module = import_module(package_name)
         p = _get_valid_package_directory(module)
         if not p :
             raise ConfigurationError('The root of a module tree must be a python package containing an __init__.py file')
-        return super().__init__('', package_name, p)
\ No newline at end of file
+
+        manifest_entry = None
+        if manifest :
+            manifest_path = default_manifest_path(p) if manifest is True else manifest
+            manifest_entry = read_fresh_manifest(manifest_path, package_name, p)
+        self.from_manifest = manifest_entry is not None
+        return super().__init__('', package_name, p, lazy, manifest_entry)
+
+    def write_manifest(self, manifest_path=None):
+        '''Write a manifest of this tree (importing every module, if lazy). Returns the path written to.'''
+        if manifest_path is None :
+            manifest_path = default_manifest_path(self.package_path)
+        write_manifest(self, manifest_path)
+        return manifest_path
\ No newline at end of file
@@ -0,0 +1,4 @@
+from django import http
+
+def get(request, merged):
+    return http.HttpResponse(f'extra:{merged}')
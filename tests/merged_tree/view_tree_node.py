@@ -0,0 +1,7 @@
+from django import http
+
+def preprocess(request, **kwargs):
+    return dict(merged=True)
+
+def get(request, merged):
+    return http.HttpResponse(f'merged root:{merged}')
@@ -0,0 +1,5 @@
+from django_tree_view import make_merged_tree_view
+
+urlpatterns = [
+    make_merged_tree_view(['tests.view_tree', ('api/v1/', 'tests.merged_tree')]),
+]
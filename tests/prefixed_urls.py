@@ -0,0 +1,8 @@
+from django.urls import include, path
+
+from django_tree_view import make_tree_view
+
+urlpatterns = [
+    path('prefix/', include([make_tree_view('tests.view_tree')])),
+    path('<int:x>/', include([make_tree_view('tests.module_tree_structure_test')])),
+]
@@ -1,13 +1,55 @@
 from datetime import date
+from io import StringIO
+from uuid import UUID
+import json
 import os
-from django.test import TestCase, override_settings
+import random
+import sys
+import tempfile
+from types import SimpleNamespace
+import threading
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
 
-from django.urls import resolve, reverse
+from django.template import Context, Template
+from django.urls import NoReverseMatch, resolve, reverse
 from django.urls.exceptions import Resolver404
 
-from django_tree_view import make_tree_view
-from django_tree_view.view_tree import ViewTree, ConfigurationError
-from django_tree_view.path_resolver import PathResolver
+from django_early_return import EarlyReturn
+from django_tree_view import make_tree_view, warm_tree_views, bulk_test_page_visibility, tree_url
+from django_tree_view.utils import encode_path, decode_path, path_codec, PathCodec
+from django_tree_view.loading import LoadedObjects
+from django_tree_view.node_dispatch import NodeDispatch
+from django_tree_view.converters import Converter, get_converter, register_converter, unregister_converter
+from django_tree_view.manifest import node_to_manifest
+from django_tree_view.preprocess_cache import PreprocessCache
+from django_tree_view.preprocess_graph import PreprocessPlan
+from django_tree_view.preload import get_link_header
+from django_tree_view.view import view, memoized_preprocess
+from django_tree_view.view_tree import ViewTree, ConfigurationError, _NOT_IMPORTED
+from django_tree_view.path_resolver import PathResolver, CompiledTree, MergedPathResolver
+from django_tree_view.resolver_cache import ResolverCache
+from django_tree_view.templates import render_node_template
+from django_tree_view.routes import iter_routes, iter_urls, iter_url_batches
+from django_tree_view.urlconf import iter_path_resolvers
+from django_tree_view.response_cache import CachePolicy, invalidate_tree_cache
+from django_tree_view.timing import add_timing_observer, remove_timing_observer, enable_server_timing, LatencyHistogram, TimingHistograms
+from django_tree_view import timing
+from tests.view_tree.concurrent import view_tree_node as concurrent_node
+
+class HexConverter(Converter):
+    name = 'hex'
+    regex = r'0x[0-9a-f]+'
+    priority = 35
+
+    def to_python(self, value):
+        return int(value, 16)
+
+    def to_url(self, value):
+        return hex(value)
 
 class ViewTreeTestCase(TestCase):
     def test_missing_init_message(self):
@@ -30,6 +72,70 @@ class ViewTreeTestCase(TestCase):
         except ImportError as e :
             self.assertEqual(e.name, 'fake_module')
 
+    def test_nodes_have_no_instance_dict(self):
+        t = ViewTree('tests.view_tree')
+        self.assertFalse(hasattr(t, '__dict__'))
+        self.assertFalse(hasattr(t.subtrees['books'], '__dict__'))
+
+    def test_node_dispatch(self):
+        t = ViewTree('tests.view_tree')
+        d = t.subtrees['books'].subtrees['int__'].dispatch
+        self.assertIs(d, t.subtrees['books'].subtrees['int__'].dispatch)
+        self.assertIs(d.handlers['head'], d.handlers['get'])
+        self.assertEqual(d.allow, 'get, post, options')
+        self.assertIsNotNone(d.preprocess)
+        self.assertTrue(t.subtrees['csrf_exempt'].dispatch.csrf_exempt)
+        self.assertEqual(t.subtrees['no_view_tree_node'].dispatch.handlers, {})
+        self.assertEqual(t.subtrees['books'].view_tree_dir, 'books/')
+        self.assertEqual(t.view_tree_dir, '')
+
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp :
+            manifest_path = os.path.join(tmp, 'manifest.json')
+            call_command('write_view_tree_manifest', 'tests.view_tree', output=manifest_path, stdout=StringIO())
+            walked = ViewTree('tests.view_tree')
+            t = ViewTree('tests.view_tree', manifest=manifest_path)
+            self.assertTrue(t.from_manifest)
+            self.assertFalse(walked.from_manifest)
+            self.assertEqual(node_to_manifest(t), node_to_manifest(walked))
+            self.assertIsNone(t.subtrees['no_view_tree_node']._module)
+
+            # Wrong root is ignored
+            self.assertFalse(ViewTree('tests.module_tree_structure_test', manifest=manifest_path).from_manifest)
+            # So is a missing manifest
+            self.assertFalse(ViewTree('tests.view_tree', manifest=os.path.join(tmp, 'missing.json')).from_manifest)
+
+    def test_stale_manifest_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp :
+            manifest_path = os.path.join(tmp, 'manifest.json')
+            ViewTree('tests.view_tree').write_manifest(manifest_path)
+            with open(manifest_path) as f :
+                data = json.load(f)
+            data['tree']['subtrees']['books']['mtime'] -= 1
+            with open(manifest_path, 'w') as f :
+                json.dump(data, f)
+            self.assertFalse(ViewTree('tests.view_tree', manifest=manifest_path).from_manifest)
+
+    def test_lazy_tree_raises_import_error_on_access(self):
+        t = ViewTree('tests.view_tree_with_import_error', lazy=True)
+        with self.assertRaises(ImportError) as cm :
+            t.module
+        self.assertEqual(cm.exception.name, 'fake_module')
+        with self.assertRaises(ImportError) :
+            t.warm()
+
+    def test_lazy_tree_imports_on_access(self):
+        t = ViewTree('tests.view_tree', lazy=True)
+        books = t.subtrees['books']
+        self.assertIs(books._module, _NOT_IMPORTED)
+        self.assertIsNotNone(books.module)
+        self.assertIsNot(books._module, _NOT_IMPORTED)
+        self.assertIsNone(t.subtrees['no_view_tree_node'].module)
+        self.assertIs(t.subtrees['foo']._module, _NOT_IMPORTED)
+
+        t.warm()
+        self.assertIsNot(t.subtrees['foo']._module, _NOT_IMPORTED)
+
 @override_settings(ROOT_URLCONF='tests.urls')
 class PathResolverTestCase(TestCase):
     def test_does_not_resolve(self):
@@ -88,11 +194,347 @@ class PathResolverTestCase(TestCase):
         handlers = r.args
         self.assertEqual(handlers[-1][1], 'banana')
 
+    def test_warm_tree_views(self):
+        resolver, = iter_path_resolvers('tests.lazy_urls')
+        self.assertIs(resolver.view_tree.subtrees['foo']._module, _NOT_IMPORTED)
+        warm_tree_views('tests.lazy_urls')
+        nodes = [resolver.view_tree]
+        while nodes :
+            node = nodes.pop()
+            self.assertIsNot(node._module, _NOT_IMPORTED, node.view_tree_path)
+            nodes.extend(node.subtrees.values())
+
     def test_path_is_captured(self):
         r = resolve('/path_capture/banana/pancake')
         handlers = r.args
         self.assertEqual(handlers[-1][1], 'banana/pancake')
 
+class FirstSegmentIndexTestCase(TestCase):
+    def test_rejects_unknown_first_segment(self):
+        r = PathResolver('tests.view_tree')
+        for path in ['static/app.css', 'admin/', 'does_not_exist', 'books'] :
+            self.assertIsNone(r(path))
+        self.assertIsNotNone(r('books/1/'))
+        self.assertIsNone(r('books/1a/'))
+        self.assertEqual(r.resolve_info(), dict(resolved=1, unresolved=1, rejected=4))
+
+    def test_index_matches_resolver(self):
+        r = PathResolver('tests.view_tree')
+        for path in CompiledTreeTestCase.paths :
+            if not r.first_segments.may_match(path) :
+                with self.assertRaises(PathResolver.NoMatch) :
+                    r.get_handler_list(path)
+
+    def test_root_captures(self):
+        from django_tree_view.path_resolver import FirstSegmentIndex
+        index = FirstSegmentIndex.from_subtrees({'a': None, 'int__': None}, False)
+        self.assertTrue(index.may_match('a/'))
+        self.assertTrue(index.may_match('5/b/'))
+        self.assertFalse(index.may_match('b/'))
+        self.assertFalse(index.may_match('5'))
+        self.assertFalse(index.may_match(''))
+        index = FirstSegmentIndex.from_subtrees({'path__': None}, False)
+        self.assertTrue(index.may_match('b'))
+        merged = MergedPathResolver([('api/', 'tests.merged_tree')])
+        self.assertFalse(merged.first_segments.may_match(''))
+        self.assertFalse(merged.first_segments.may_match('extra/'))
+        self.assertEqual(merged('api/extra/')[0][-1][0].view_tree_path, 'extra')
+
+class CompiledTreeTestCase(TestCase):
+    paths = [
+        '', 'foo/', 'foo', 'foo/does_not_exist/', 'no_view_tree_node/', 'no_view_tree_node/sub_node/',
+        'books/1/', 'books/-1/', 'books/1a/', 'books/1/raise_early_return/', 'books/int__/',
+        'multi_capture/1/', 'multi_capture/banana/', 'multi_capture/int__/',
+        'dates/2020-02-01/', 'dates/2020-02-30/', 'dates/2020-02-444/', 'dates/0000-01-01/',
+        'path_capture/banana/pancake', 'path_capture/banana/', 'path_capture/', '/foo/',
+    ]
+
+    def test_compiled_matches_uncompiled(self):
+        compiled = PathResolver('tests.view_tree')
+        uncompiled = PathResolver('tests.view_tree', compiled=False)
+        self.assertIsInstance(compiled.compiled_tree, CompiledTree)
+        self.assertIsNone(uncompiled.compiled_tree)
+
+        def resolve_with(resolver, path):
+            try :
+                return [(node.view_tree_path, arg) for node, arg in resolver.get_handler_list(path)]
+            except PathResolver.NoMatch :
+                return None
+
+        for path in self.paths :
+            with self.subTest(path=path) :
+                self.assertEqual(resolve_with(compiled, path), resolve_with(uncompiled, path))
+
+    def test_only_existing_captures_are_compiled(self):
+        t = CompiledTree(ViewTree('tests.view_tree'))
+        self.assertEqual(len(t.root.fixed['books'].captures), 1)
+        self.assertIsNone(t.root.fixed['books'].path)
+        self.assertEqual(len(t.root.fixed['multi_capture'].captures), 2)
+        self.assertEqual(len(t.root.fixed['path_capture'].captures), 0)
+        self.assertIsNotNone(t.root.fixed['path_capture'].path)
+
+@override_settings(ROOT_URLCONF='tests.merged_urls')
+class MergedTreeTestCase(TestCase):
+    def test_resolves_each_tree(self):
+        self.assertEqual(self.client.get('/books/67/').content, b'root:1:book_id:67')
+        self.assertEqual(self.client.get('/api/v1/').content, b'merged root:True')
+        self.assertEqual(self.client.get('/api/v1/extra/').content, b'extra:True')
+        self.assertEqual(self.client.get('/api/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/missing/').status_code, 404)
+
+    def test_matches_separate_resolvers(self):
+        merged = MergedPathResolver(['tests.view_tree'])
+        single = PathResolver('tests.view_tree')
+        for path in CompiledTreeTestCase.paths :
+            try :
+                expected = [(n.view_tree_path, a) for n, a in single.get_handler_list(path)]
+            except PathResolver.NoMatch :
+                expected = None
+            try :
+                actual = [(n.view_tree_path, a) for n, a in merged.get_handler_list(path)]
+            except PathResolver.NoMatch :
+                actual = None
+            self.assertEqual(actual, expected, path)
+
+    def test_conflicts(self):
+        with self.assertRaises(ConfigurationError) as cm :
+            MergedPathResolver(['tests.view_tree', 'tests.merged_tree'])
+        self.assertIn('/ is defined by both tests.view_tree and tests.merged_tree', str(cm.exception))
+        with self.assertRaises(ConfigurationError) as cm :
+            MergedPathResolver(['tests.view_tree', ('books/', 'tests.merged_tree')])
+        self.assertIn('books/ is defined by tests.view_tree, but tests.merged_tree is mounted under it', str(cm.exception))
+        with self.assertRaises(ConfigurationError) as cm :
+            MergedPathResolver([('books/', 'tests.merged_tree'), 'tests.view_tree'])
+        self.assertIn('books/ is defined by tests.view_tree, but another tree is mounted under it', str(cm.exception))
+        with self.assertRaises(ValueError) :
+            MergedPathResolver([('api', 'tests.merged_tree')])
+
+    def test_tree_url(self):
+        self.assertEqual(tree_url('extra', root_module_name='tests.merged_tree'), '/api/v1/extra/')
+        self.assertEqual(tree_url('books/int__', 67), '/books/67/')
+
+class ResolverCacheTestCase(TestCase):
+    def test_lru_eviction(self):
+        c = ResolverCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        self.assertIs(c.get('b'), ResolverCache.MISSING)
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.info(), dict(hits=2, misses=1, evictions=1, size=2, maxsize=2))
+
+    def test_fifo_eviction(self):
+        c = ResolverCache(2, 'fifo')
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        self.assertIs(c.get('a'), ResolverCache.MISSING)
+
+    def test_resolver_caches_handler_lists(self):
+        r = PathResolver('tests.view_tree', cache_size=10, negative_cache_size=10)
+        first = r('books/1/')
+        self.assertEqual(r('books/1/'), first)
+        self.assertEqual(r.cache.hits, 1)
+
+        # Note - 'does_not_exist/' would be rejected by the first segment, before the negative cache is checked
+        self.assertIsNone(r('books/does_not_exist/'))
+        self.assertIsNone(r('books/does_not_exist/'))
+        self.assertEqual(r.negative_cache.hits, 1)
+
+        r.load_view_tree()
+        self.assertEqual(len(r.cache), 0)
+        self.assertEqual(len(r.negative_cache), 0)
+
+    def test_cache_info(self):
+        r = PathResolver('tests.view_tree', cache_size=10)
+        info = r.cache_info()
+        self.assertEqual(info['cache'], dict(hits=0, misses=0, evictions=0, size=0, maxsize=10))
+        self.assertIsNone(info['negative_cache'])
+
+    @override_settings(DEBUG=True)
+    def test_negative_cache_ignored_when_debug(self):
+        r = PathResolver('tests.view_tree', negative_cache_size=10)
+        r('does_not_exist/')
+        self.assertEqual(r.negative_cache.info()['size'], 0)
+
+@override_settings(DEBUG=True)
+class RefreshTestCase(TestCase):
+    '''Builds a view tree in a temporary directory, and modifies it between requests'''
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.tmp.name)
+        self.package_name = f'refresh_tree_{id(self)}'
+        self.root = os.path.join(self.tmp.name, self.package_name)
+        self.write('__init__.py')
+        self.write('a/view_tree_node.py')
+        self.resolver = PathResolver(self.package_name)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        for name in [n for n in sys.modules if n.startswith(self.package_name)] :
+            del sys.modules[name]
+        self.tmp.cleanup()
+
+    def write(self, name, content=''):
+        full_path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f :
+            f.write(content)
+        self.bump_mtime(os.path.dirname(full_path))
+
+    def remove(self, name):
+        full_path = os.path.join(self.root, name)
+        os.remove(full_path)
+        self.bump_mtime(os.path.dirname(full_path))
+
+    def bump_mtime(self, directory):
+        # Don't rely on file system timestamp resolution
+        t = os.stat(directory).st_mtime + 10
+        os.utime(directory, (t, t))
+
+    def test_added_module_is_found(self):
+        self.assertIsNone(self.resolver('b/'))
+        self.write('b/view_tree_node.py')
+        self.assertIsNotNone(self.resolver('b/'))
+
+    def test_unchanged_tree_is_not_rebuilt(self):
+        a = self.resolver.view_tree.subtrees['a']
+        self.assertIsNone(self.resolver('favicon.ico'))
+        self.assertFalse(self.resolver.refresh_view_tree())
+        self.assertIs(self.resolver.view_tree.subtrees['a'], a)
+
+    def test_deleted_module_is_not_served(self):
+        self.assertIsNotNone(self.resolver('a/'))
+        self.remove('a/view_tree_node.py')
+        self.assertIsNone(self.resolver('a/'))
+        self.assertNotIn(f'{self.package_name}.a.view_tree_node', sys.modules)
+
+    def test_init_added_after_404(self):
+        self.write('c/d/view_tree_node.py')
+        self.assertIsNotNone(self.resolver('c/d/'))
+        self.assertIsNone(sys.modules[f'{self.package_name}.c'].__file__)
+        self.write('c/__init__.py')
+        self.assertIsNotNone(self.resolver('c/d/'))
+        self.assertIsNotNone(sys.modules[f'{self.package_name}.c'].__file__)
+
+    def test_added_ancestor_hints(self):
+        self.write('c/d/view_tree_node.py')
+        self.assertIsNotNone(self.resolver('c/d/'))
+        self.assertIsNone(get_link_header(self.resolver.get_handler_list('c/d/')))
+        self.write('c/view_tree_node.py', "PRECONNECT = ['https://cdn.example.com']\n")
+        # The request refreshes the tree
+        self.assertIsNotNone(self.resolver('c/d/'))
+        self.assertEqual(get_link_header(self.resolver.get_handler_list('c/d/')), '<https://cdn.example.com>; rel=preconnect')
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class ConverterTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Note - converters must be registered before view trees are loaded, so hex__ only captures in trees loaded here
+        register_converter(HexConverter())
+        cls.addClassCleanup(unregister_converter, 'hex')
+        cls.resolver = PathResolver('tests.view_tree')
+
+    def test_uuid(self):
+        r = resolve('/converters/12345678-1234-1234-1234-123456789abc/')
+        self.assertEqual(r.args[-1][1], UUID('12345678-1234-1234-1234-123456789abc'))
+
+    def test_custom_converter_before_slug(self):
+        node, arg = self.resolver.get_handler_list('converters/0xff/')[-1]
+        self.assertEqual(arg, 255)
+        self.assertEqual(node.view_tree_path, 'converters/hex__')
+
+    def test_slug(self):
+        r = resolve('/converters/some-slug/')
+        self.assertEqual(r.args[-1][1], 'some-slug')
+        with self.assertRaises(Resolver404) :
+            resolve('/converters/not a slug/')
+
+    def test_uncompiled_resolver_uses_registry(self):
+        r = PathResolver('tests.view_tree', compiled=False)
+        self.assertEqual(r.get_handler_list('converters/0xff/')[-1][1], 255)
+
+    def test_to_url(self):
+        self.assertEqual(get_converter('date__').to_url(date(2020, 2, 1)), '2020-02-01')
+        self.assertEqual(get_converter('hex__').to_url(255), '0xff')
+        self.assertIsNone(get_converter('path__'))
+        self.assertIsNone(get_converter('int'))
+
+    def test_invalid_name(self):
+        class Bad(Converter):
+            name = 'bad_'
+            regex = '.*'
+        with self.assertRaises(ValueError) :
+            register_converter(Bad())
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class TreeUrlTestCase(TestCase):
+    def test_tree_url(self):
+        self.assertEqual(tree_url(''), '/')
+        self.assertEqual(tree_url('books/'), '/books/')
+        self.assertEqual(tree_url('books/int__/', 67), '/books/67/')
+        self.assertEqual(tree_url('books/int__/raise_early_return', 67), '/books/67/raise_early_return/')
+        self.assertEqual(tree_url('dates/date__/', date(2020, 2, 1)), '/dates/2020-02-01/')
+        self.assertEqual(tree_url('multi_capture/string__/', 'a b'), '/multi_capture/a%20b/')
+        self.assertEqual(tree_url('path_capture/path__', 'banana/pancake'), '/path_capture/banana/pancake')
+
+    def test_tree_url_resolves(self):
+        for url in [tree_url('books/int__/', 67), tree_url('converters/slug__/', 'a-b'), tree_url('path_capture/path__', 'a/b')] :
+            with self.subTest(url=url) :
+                resolve(url)
+
+    def test_invalid(self):
+        with self.assertRaises(NoReverseMatch) :
+            tree_url('does_not_exist/')
+        with self.assertRaises(NoReverseMatch) :
+            tree_url('books/int__/')
+        with self.assertRaises(NoReverseMatch) :
+            tree_url('books/int__/', 'abc')
+        with self.assertRaises(NoReverseMatch) :
+            tree_url('multi_capture/string__/', 'a/b')
+
+    @override_settings(ROOT_URLCONF='tests.prefixed_urls')
+    def test_prefix(self):
+        self.assertEqual(tree_url('books/int__/', 67), '/prefix/books/67/')
+        with self.assertRaises(NoReverseMatch) :
+            tree_url('a/', root_module_name='tests.module_tree_structure_test')
+
+    def test_template_tag(self):
+        t = Template("{% load tree_view %}{% tree_url 'books/int__/' book_id %} {% tree_url 'foo/' as foo_url %}{{ foo_url }}")
+        self.assertEqual(t.render(Context(dict(book_id=5))), '/books/5/ /foo/')
+        self.assertEqual(t.render(Context(dict(book_id=5, request=RequestFactory().get('/')))), '/books/5/ /foo/')
+
+class PathCodecTestCase(TestCase):
+    def test_encode_decode(self):
+        self.assertEqual(encode_path('a/b_c/'), 'a_-b__c_-')
+        self.assertEqual(decode_path('a_-b__c_-'), 'a/b_c/')
+        self.assertEqual(decode_path('___-'), '_/')
+
+    def test_round_trip_property(self):
+        rng = random.Random(0)
+        alphabet = '/_-a_-/é%'
+        paths = [''.join(rng.choice(alphabet) for i in range(rng.randrange(20))) for j in range(2000)]
+        for path, encoded in zip(paths, path_codec.encode_many(paths)) :
+            self.assertNotIn('/', encoded)
+            self.assertEqual(path_codec.decode(encoded, strict=True), path)
+        self.assertEqual(list(path_codec.decode_many(path_codec.encode_many(paths))), paths)
+
+    def test_strict_decode(self):
+        for malformed in ['_', 'a_b', '_-_', '___', 'a/b', '/'] :
+            with self.subTest(malformed=malformed) :
+                self.assertEqual(decode_path(malformed), decode_path(malformed, strict=False))
+                with self.assertRaises(ValueError) :
+                    decode_path(malformed, strict=True)
+
+    def test_invalid_substitutions(self):
+        with self.assertRaises(ValueError) :
+            PathCodec({'a': 'x', 'b': 'x'})
+        with self.assertRaises(ValueError) :
+            PathCodec({'/': '_-'})
+
 @override_settings(ROOT_URLCONF='tests.urls')
 # Add view tree to template dirs:
 @override_settings(TEMPLATES=[
@@ -131,6 +573,15 @@ class IntegrationTestCase(TestCase):
         r = self.client.get('/books/67/')
         self.assertEqual(r.content, b'root:1:book_id:67')
 
+    def test_head_falls_back_to_get(self):
+        r = self.client.head('/books/67/')
+        self.assertEqual(r.status_code, 200)
+
+    def test_unknown_method_not_allowed(self):
+        r = self.client.generic('PROPFIND', '/books/67/', HTTP_ORIGIN='http://testserver')
+        self.assertEqual(r.status_code, 405)
+        self.assertEqual(r['allow'], 'get, post, options')
+
     def test_post_fails_csrf(self):
         r = self.client.post('/books/67/')
         self.assertEqual(r.status_code, 403)
@@ -146,4 +597,536 @@ class IntegrationTestCase(TestCase):
         r = self.client.get('/with_named_template/')
         self.assertEqual(r.content, b'template a')
 
+    def test_lazy_tree_view(self):
+        r = PathResolver('tests.view_tree', lazy=True)
+        handlers, kwargs = r('books/67/')
+        response = view(RequestFactory().get('/books/67/'), *handlers)
+        self.assertEqual(response.content, b'root:1:book_id:67')
+        self.assertTrue(all(node._module is not _NOT_IMPORTED for node, arg in handlers))
+        self.assertIs(r.view_tree.subtrees['foo']._module, _NOT_IMPORTED)
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_get_is_cached(self):
+        first = self.client.get('/cached/')
+        self.assertEqual(self.client.get('/cached/').content, first.content)
+        self.assertEqual(self.client.head('/cached/').status_code, 200)
+        self.assertNotEqual(self.client.get('/cached/?page=2').content, first.content)
+
+    @override_settings(ALLOWED_HOSTS=['a.example.com', 'b.example.com'])
+    def test_key_includes_host(self):
+        first = self.client.get('/cached/', HTTP_HOST='a.example.com')
+        self.assertEqual(self.client.get('/cached/', HTTP_HOST='a.example.com').content, first.content)
+        self.assertNotEqual(self.client.get('/cached/', HTTP_HOST='b.example.com').content, first.content)
+
+    def test_varying_responses_are_not_cached(self):
+        for query in ['?vary', '?csrf', '?session'] :
+            with self.subTest(query=query) :
+                first = self.client.get('/cached/' + query)
+                self.assertNotEqual(self.client.get('/cached/' + query).content, first.content)
+
+    def test_head_response_is_not_served_to_get(self):
+        self.client.head('/cached/')
+        self.assertTrue(self.client.get('/cached/').content.startswith(b'cached:'))
+
+    def test_failed_preprocess_is_not_served_from_cache(self):
+        self.client.get('/cached/')
+        with self.assertRaises(EarlyReturn) :
+            self.client.get('/cached/', HTTP_X_DENY='1')
+
+    def test_public(self):
+        first = self.client.get('/cached/public/')
+        self.assertEqual(self.client.get('/cached/public/', HTTP_X_DENY='1').content, first.content)
+
+    def test_private_response_is_not_cached(self):
+        first = self.client.get('/cached/public/?nocache')
+        self.assertNotEqual(self.client.get('/cached/public/?nocache').content, first.content)
+
+    def test_invalidate_branch(self):
+        book_1 = self.client.get('/cached/1/detail/').content
+        book_2 = self.client.get('/cached/2/detail/').content
+        invalidate_tree_cache('cached/int__', 1)
+        self.assertNotEqual(self.client.get('/cached/1/detail/').content, book_1)
+        self.assertEqual(self.client.get('/cached/2/detail/').content, book_2)
+
+        root = self.client.get('/cached/').content
+        invalidate_tree_cache('cached/int__')
+        self.assertNotEqual(self.client.get('/cached/2/detail/').content, book_2)
+        self.assertEqual(self.client.get('/cached/').content, root)
+        invalidate_tree_cache('cached')
+        self.assertNotEqual(self.client.get('/cached/').content, root)
+
+    def test_evicted_tag_invalidates(self):
+        first = self.client.get('/cached/1/').content
+        # locmem keys look like ':1:<key>'
+        cache.delete_many([k.split(':', 2)[2] for k in list(cache._cache) if 'django_tree_view.tag' in k])
+        self.assertNotEqual(self.client.get('/cached/1/').content, first)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError) :
+            CachePolicy(dict(timout=5))
+        with self.assertRaises(ValueError) :
+            CachePolicy(dict(vary=['accept-language']))
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class ConditionalGetTestCase(TestCase):
+    def test_validators_are_added(self):
+        r = self.client.get('/conditional/')
+        self.assertEqual(r['ETag'], '"v1"')
+        self.assertEqual(r['Last-Modified'], 'Wed, 01 Jan 2020 00:00:00 GMT')
+
+    def test_not_modified(self):
+        content = self.client.get('/conditional/').content
+        r = self.client.get('/conditional/', HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(self.client.head('/conditional/', HTTP_IF_NONE_MATCH='"v1"').status_code, 304)
+        self.assertEqual(self.client.get('/conditional/', HTTP_IF_MODIFIED_SINCE='Thu, 02 Jan 2020 00:00:00 GMT').status_code, 304)
+        # The handler was not run
+        self.assertEqual(self.client.get('/conditional/').content, f'conditional:{int(content.split(b":")[1]) + 1}'.encode())
+
+    def test_modified(self):
+        r = self.client.get('/conditional/?version=2', HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['ETag'], '"v2"')
+
+    def test_cached_response_not_modified(self):
+        cache.clear()
+        self.assertEqual(self.client.get('/cached/public/')['ETag'], '"public"')
+        self.assertEqual(self.client.get('/cached/public/', HTTP_IF_NONE_MATCH='"public"').status_code, 304)
+
+    async def test_async_etag(self):
+        with self.settings(ROOT_URLCONF='tests.async_urls') :
+            r = await self.async_client.get('/async_node/', headers={'If-None-Match': '"async"'})
+        self.assertEqual(r.status_code, 304)
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class RoutesTestCase(TestCase):
+    def test_iter_routes(self):
+        routes = {r.view_tree_path: r for r in iter_routes()}
+        self.assertEqual(routes['books/int__'].pattern, '/books/<int>/')
+        self.assertEqual(routes['books/int__'].methods, ['get', 'post', 'options'])
+        self.assertEqual(routes['path_capture/path__'].pattern, '/path_capture/<path>')
+        self.assertEqual(routes['books/int__'].url(5), '/books/5/')
+        # No view_tree_node.py
+        self.assertNotIn('no_view_tree_node', routes)
+
+    def test_iter_urls(self):
+        urls = [url for url, route in iter_urls()]
+        self.assertEqual(len(urls), len(set(urls)))
+        for url in ['/', '/books/', '/books/1/', '/books/2/', '/books/1/raise_early_return/', '/counted/no_memo/c/'] :
+            self.assertIn(url, urls)
+        # Captures without enumerate_args() are skipped
+        self.assertFalse(any(url.startswith('/dates/') for url in urls))
+        self.assertLess(urls.index('/books/1/raise_early_return/'), urls.index('/books/2/'))
+
+    def test_method(self):
+        urls = [url for url, route in iter_urls(method='get')]
+        self.assertIn('/books/1/', urls)
+        self.assertNotIn('/books/', urls)
+        self.assertNotIn('/books/1/raise_early_return/', urls)
+
+    def test_every_url_resolves(self):
+        for url, route in iter_urls() :
+            self.assertEqual(resolve(url).args[-1][0].view_tree_path, route.view_tree_path)
+
+    def test_batches(self):
+        batches = list(iter_url_batches(batch_size=3))
+        self.assertTrue(all(len(b) == 3 for b in batches[:-1]))
+        self.assertEqual([url for url, route in sum(batches, [])], [url for url, route in iter_urls()])
+
+@override_settings(ROOT_URLCONF='tests.urls', TEMPLATES=[{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django_tree_view.templates.Loader', ['tests.view_tree'])],
+    },
+}])
+class TemplateLoaderTestCase(TestCase):
+    def get_loader(self):
+        from django.template import engines
+        return engines['django'].engine.template_loaders[0]
+
+    def test_relative_template_works(self):
+        self.assertEqual(self.client.get('/with_template/').content, b'basic template')
+        self.assertEqual(self.client.get('/with_named_template/').content, b'template a')
+
+    def test_templates_are_cached(self):
+        loader = self.get_loader()
+        template = loader.get_template('with_template/template.html')
+        self.assertIs(loader.get_template('with_template/template.html'), template)
+        with self.settings(DEBUG=True) :
+            self.assertIs(loader.get_template('with_template/template.html'), template)
+
+    def test_changed_template_is_reloaded_when_debug(self):
+        loader = self.get_loader()
+        template = loader.get_template('with_template/template.html')
+        path = template.origin.name
+        t = os.stat(path).st_mtime + 10
+        os.utime(path, (t, t))
+        with self.settings(DEBUG=False) :
+            self.assertIs(loader.get_template('with_template/template.html'), template)
+        with self.settings(DEBUG=True) :
+            self.assertIsNot(loader.get_template('with_template/template.html'), template)
+
+    def test_other_directories_are_not_searched(self):
+        from django.template import TemplateDoesNotExist
+        with self.assertRaises(TemplateDoesNotExist) :
+            self.get_loader().get_template('../urls.py')
+        with self.assertRaises(TemplateDoesNotExist) :
+            self.get_loader().get_template('admin/base.html')
+
+    def test_render_node_template(self):
+        request = RequestFactory().get('/with_template/')
+        request.view_tree_dir = 'with_template/'
+        response = render_node_template(request, 'template.html')
+        self.assertEqual(response.render().content, b'basic template')
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class TimingTestCase(TestCase):
+    def setUp(self):
+        self.histograms = TimingHistograms()
+        add_timing_observer(self.histograms)
+    def tearDown(self):
+        remove_timing_observer(self.histograms)
+        enable_server_timing(False)
+
+    def test_disabled_by_default(self):
+        remove_timing_observer(self.histograms)
+        self.assertFalse(timing.enabled)
+        self.client.get('/books/67/')
+        self.assertEqual(self.histograms.summary(), {})
+
+    def test_phases_are_recorded_per_node(self):
+        r = self.client.get('/books/67/')
+        self.assertEqual(r.content, b'root:1:book_id:67')
+        self.assertNotIn('Server-Timing', r)
+        summary = self.histograms.summary()
+        self.assertEqual(summary['books/int__']['resolve']['count'], 1)
+        self.assertEqual(summary['books/int__']['handler']['count'], 1)
+        self.assertEqual(summary['']['preprocess']['count'], 1)
+        self.assertEqual(summary['books/int__']['preprocess']['count'], 1)
+        self.client.get('/bar/')
+        self.assertEqual(self.histograms.get(None, 'resolve').count, 1)
+
+    def test_server_timing_header(self):
+        enable_server_timing()
+        r = self.client.get('/books/67/')
+        self.assertEqual(r.content, b'root:1:book_id:67')
+        metrics = [m.split(';')[:2] for m in r['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, [
+            ['resolve', metrics[0][1]],
+            ['preprocess', 'desc=""'],
+            ['preprocess', 'desc="books/int__"'],
+            ['handler', 'desc="books/int__"'],
+        ])
+
+    def test_cached_node(self):
+        cache.clear()
+        enable_server_timing()
+        self.client.get('/cached/')
+        r = self.client.get('/cached/')
+        # preprocess() still runs on cache hits (the policy isn't public), but the handler doesn't
+        self.assertEqual(r['Server-Timing'].count('preprocess;'), 2)
+        self.assertNotIn('handler;', r['Server-Timing'])
+        self.assertEqual(self.histograms.get('cached', 'preprocess').count, 2)
+        self.assertEqual(self.histograms.get('cached', 'handler').count, 1)
+
+    def test_concurrent_steps(self):
+        enable_server_timing()
+        # flags/ and perms/ only complete if they still run concurrently while timed
+        r = self.client.get('/concurrent/flags/perms/')
+        self.assertEqual(r.content, b'base:flags:base perms')
+        self.assertEqual(r['Server-Timing'].count('preprocess;'), 4)
+        self.assertEqual(self.histograms.get('concurrent/flags', 'preprocess').count, 1)
+        self.assertEqual(self.histograms.get('concurrent/flags/perms', 'preprocess').count, 1)
+
+    async def test_async_view(self):
+        enable_server_timing()
+        with self.settings(ROOT_URLCONF='tests.async_urls') :
+            r = await self.async_client.get('/async_node/sync_child/')
+        self.assertEqual(r.content, b'sync:1:True')
+        self.assertEqual(r['Server-Timing'].count('preprocess;'), 3)
+        self.assertEqual(self.histograms.get('async_node/sync_child', 'handler').count, 1)
+
+    async def test_async_concurrent_steps(self):
+        enable_server_timing()
+        with self.settings(ROOT_URLCONF='tests.async_urls') :
+            r = await self.async_client.get('/concurrent/flags/perms/')
+        self.assertEqual(r.content, b'base:flags:base perms')
+        self.assertEqual(r['Server-Timing'].count('preprocess;'), 4)
+
+    def test_histogram(self):
+        h = LatencyHistogram()
+        self.assertIsNone(h.percentile(50))
+        for i in range(1, 101) :
+            h.record(i / 1000)
+        self.assertEqual(h.count, 100)
+        self.assertAlmostEqual(h.summary()['mean'], 0.0505)
+        # Buckets are accurate to within a factor of 2
+        self.assertTrue(0.05 <= h.percentile(50) <= 0.1)
+        self.assertEqual(h.percentile(100), 0.1)
+        h.record(1000)
+        self.assertEqual(h.percentile(100), 1000)
+
+@override_settings(ROOT_URLCONF='tests.async_urls')
+class AsyncViewTestCase(TestCase):
+    async def test_async_handler_and_preprocess(self):
+        r = await self.async_client.get('/async_node/')
+        self.assertEqual(r.content, b'async:1:True')
+
+    async def test_sync_child_of_async_node(self):
+        r = await self.async_client.get('/async_node/sync_child/')
+        self.assertEqual(r.content, b'sync:1:True')
+
+    async def test_sync_branch(self):
+        r = await self.async_client.get('/books/67/')
+        self.assertEqual(r.content, b'root:1:book_id:67')
+
+    async def test_method_not_allowed(self):
+        r = await self.async_client.options('/async_node/')
+        self.assertEqual(r['allow'], 'get, options')
+
+    def test_async_modules_work_with_sync_view(self):
+        with self.settings(ROOT_URLCONF='tests.urls') :
+            r = self.client.get('/async_node/')
+        self.assertEqual(r.content, b'async:1:True')
+
+    def test_node_dispatch_detects_coroutines(self):
+        t = ViewTree('tests.view_tree')
+        d = t.subtrees['async_node'].dispatch
+        self.assertTrue(d.preprocess_is_async)
+        self.assertEqual(d.async_methods, {'get', 'head'})
+        self.assertFalse(t.subtrees['books'].dispatch.is_async)
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class ProvidersTestCase(TestCase):
+    def test_unused_values_are_not_computed(self):
+        response = self.client.get('/lazy/unused/')
+        self.assertEqual(response.content, b'unused')
+        self.assertFalse(hasattr(response.wsgi_request, 'profile_calls'))
+
+    def test_values_are_computed_once(self):
+        response = self.client.get('/lazy/used/')
+        self.assertEqual(response.content, b'lazy:lazy:lazy settings')
+        self.assertEqual(response.wsgi_request.profile_calls, 1)
+        self.assertEqual(response.wsgi_request.settings_calls, 1)
+
+    def test_descendant_preprocess(self):
+        response = self.client.get('/lazy/used_by_preprocess/')
+        self.assertEqual(response.content, b'Lazy')
+        self.assertFalse(hasattr(response.wsgi_request, 'settings_calls'))
+
+    def test_memoized_across_paths(self):
+        request = RequestFactory().get('/')
+        view.test_page_visibility(request, *resolve('/lazy/used/').args)
+        self.assertFalse(hasattr(request, 'profile_calls'))
+        view.test_page_visibility(request, *resolve('/lazy/used_by_preprocess/').args)
+        self.assertEqual(request.profile_calls, 1)
+        # The lazy value was created by the (memoized) lazy/ node, so it's shared
+        branch_data = memoized_preprocess(request, resolve('/lazy/used/').args)
+        self.assertEqual(branch_data['profile'].name, 'lazy')
+        self.assertEqual(request.profile_calls, 1)
+
+@override_settings(ROOT_URLCONF='tests.urls', TEMPLATES=[{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django_tree_view.templates.Loader', ['tests.view_tree'])],
+    },
+}])
+class StreamingTestCase(TestCase):
+    def test_generator_handler(self):
+        response = self.client.get('/streaming/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(b''.join(response.streaming_content), b'n\n1!\n2!\n3!\n')
+
+    def test_head_does_not_iterate_body(self):
+        from tests.view_tree.streaming.declared import view_tree_node
+        handler_calls, iterations = view_tree_node.handler_calls, view_tree_node.iterations
+        response = self.client.head('/streaming/declared/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        # The handler runs (so HEAD gets the same status as GET), but its result isn't iterated
+        self.assertEqual(view_tree_node.handler_calls, handler_calls + 1)
+        self.assertEqual(view_tree_node.iterations, iterations)
+        self.assertEqual(self.client.head('/streaming/declared/', {'missing': 1}).status_code, 404)
+
+    async def test_async_generator_handler(self):
+        with self.settings(ROOT_URLCONF='tests.async_urls') :
+            response = await self.async_client.get('/streaming/async_gen/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'012')
+
+    def test_declared(self):
+        response = self.client.get('/streaming/declared/')
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        response = self.client.get('/streaming/declared/', {'missing': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.streaming)
+
+    def test_declared_async(self):
+        response = self.client.get('/streaming/declared_async/')
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+
+    async def test_declared_async_under_asgi(self):
+        with self.settings(ROOT_URLCONF='tests.async_urls') :
+            response = await self.async_client.get('/streaming/declared_async/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class ConcurrentPreprocessTestCase(TestCase):
+    def setUp(self):
+        concurrent_node.calls.clear()
+        concurrent_node.release_slow.clear()
+
+    def test_plan(self):
+        plan = PreprocessPlan.for_handlers(resolve('/concurrent/deny/slow/after/').args)
+        # The root and concurrent/ are undeclared, so everything waits for them. after/ needs slow/, but not deny/
+        self.assertEqual([(deps, ancestors) for i, deps, ancestors in plan.steps], [
+            (frozenset(), ()),
+            (frozenset({0}), (0,)),
+            (frozenset({1}), (0, 1)),
+            (frozenset({1}), (0, 1)),
+            (frozenset({1, 3}), (0, 1, 3)),
+        ])
+        self.assertIs(PreprocessPlan.for_handlers(resolve('/concurrent/deny/slow/after/').args), plan)
+        self.assertIsNone(PreprocessPlan.for_handlers(resolve('/books/1/').args))
+
+    def test_independent_steps_run_concurrently(self):
+        response = self.client.get('/concurrent/flags/perms/')
+        self.assertEqual(response.content, b'base:flags:base perms')
+
+    def test_undeclared_steps_run_on_request_thread(self):
+        response = self.client.get('/concurrent/flags/perms/')
+        self.assertEqual(response.wsgi_request.base_thread, threading.current_thread().name)
+
+    @override_settings(ROOT_URLCONF='tests.async_urls')
+    async def test_async(self):
+        response = await self.async_client.get('/concurrent/flags/perms/')
+        self.assertEqual(response.content, b'base:flags:base perms')
+        self.assertFalse(response.asgi_request.base_thread.startswith('tree_view_preprocess'))
+
+    def test_early_return_cancels_the_rest(self):
+        # slow/ blocks until the test is over
+        self.addCleanup(concurrent_node.release_slow.set)
+        with self.assertRaises(EarlyReturn) :
+            self.client.get('/concurrent/deny/slow/after/')
+        # We don't wait for slow/, and after/ (which depends on it) never runs
+        self.assertEqual(concurrent_node.calls, ['deny'])
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class PreloadTestCase(TestCase):
+    links = '</static/preload/preload.css>; rel=preload; as=style, </fonts/serif.woff2>; rel=preload; as=font; crossorigin, <https://cdn.example.com>; rel=preconnect, </static/preload/child.js>; rel=preload; as=script'
+
+    def test_inherited_links(self):
+        self.assertEqual(self.client.get('/preload/child/')['Link'], self.links)
+
+    def test_early_hints(self):
+        hints = []
+        self.client.get('/preload/child/', **{'wsgi.early_hints': hints.append})
+        self.assertEqual(hints, [[('Link', self.links)]])
+        self.client.post('/preload/child/', **{'wsgi.early_hints': hints.append})
+        self.assertEqual(len(hints), 1)
+
+    def test_no_hints(self):
+        self.assertFalse(self.client.get('/books/1/').has_header('Link'))
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class LoadingTestCase(TestCase):
+    def setUp(self):
+        self.permission = Permission.objects.select_related('content_type').first()
+        self.other = Permission.objects.exclude(content_type=self.permission.content_type).first()
+
+    def test_chain_loaded_in_one_query(self):
+        with self.assertNumQueries(1) :
+            response = self.client.get(f'/loaded/{self.permission.content_type_id}/{self.permission.pk}/')
+        self.assertEqual(response.content.decode(), f'{self.permission.content_type.model}:{self.permission.codename}')
+        self.assertEqual(LoadedObjects.for_request(response.wsgi_request).queries, 1)
+
+    def test_missing(self):
+        self.assertEqual(self.client.get(f'/loaded/{self.permission.content_type_id}/0/').status_code, 404)
+        self.assertEqual(self.client.get(f'/loaded/0/{self.permission.pk}/').status_code, 404)
+
+    def test_invalid_arg(self):
+        # 'abc' can't be an integer pk, and the other is out of range - both paths resolve, but the loads raise Http404
+        for path in ['/loaded/abc/', f'/loaded/{self.permission.content_type_id}/999999999999999999999999/'] :
+            with self.subTest(path=path) :
+                resolve(path)
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_load_requires_capture(self):
+        module = SimpleNamespace(__name__='not_capturing.view_tree_node', LOAD=dict(model=Permission))
+        with self.assertRaises(ConfigurationError) :
+            NodeDispatch(module)
+        self.assertIsNotNone(NodeDispatch(module, captures=True).load)
+
+    def test_parent_mismatch(self):
+        self.assertEqual(self.client.get(f'/loaded/{self.other.content_type_id}/{self.permission.pk}/').status_code, 404)
+
+    def test_visibility_without_batching(self):
+        request = RequestFactory().get('/')
+        path = f'/loaded/{self.permission.content_type_id}/'
+        self.assertTrue(view.test_page_visibility(request, *resolve(path).args))
+        branch_data = memoized_preprocess(request, resolve(path + f'{self.permission.pk}/').args)
+        self.assertEqual(branch_data['permission'], self.permission)
+        self.assertEqual(LoadedObjects.for_request(request).queries, 2)
+
+class PageVisibilityTestCase(TestCase):
+    def setUp(self):
+        self.resolver = PathResolver('tests.view_tree')
+        self.request = RequestFactory().get('/')
+
+    def is_visible(self, path):
+        return view.test_page_visibility(self.request, *self.resolver.get_handler_list(path))
+
+    def test_shared_prefix_preprocessed_once(self):
+        self.assertTrue(self.is_visible('counted/a/'))
+        self.assertTrue(self.is_visible('counted/b/'))
+        self.assertEqual(self.request.counted_calls, 1)
+        cache = PreprocessCache.for_request(self.request)
+        self.assertEqual(cache.calls, 2)
+        self.assertEqual(cache.saved, 2)
+
+    def test_early_return_is_cached(self):
+        for i in range(2) :
+            with self.assertRaises(EarlyReturn) :
+                self.is_visible('books/1/raise_early_return/')
+        self.assertEqual(PreprocessCache.for_request(self.request).saved, 3)
+
+    def test_opt_out(self):
+        self.is_visible('counted/no_memo/c/')
+        self.is_visible('counted/no_memo/c/')
+        self.assertEqual(self.request.counted_calls, 1)
+        self.assertEqual(self.request.no_memo_calls, 2)
+
+    def test_separate_requests_are_not_shared(self):
+        self.is_visible('counted/a/')
+        self.request = RequestFactory().get('/')
+        self.is_visible('counted/a/')
+        self.assertEqual(self.request.counted_calls, 1)
+        self.assertEqual(PreprocessCache.for_request(self.request).saved, 0)
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class BulkPageVisibilityTestCase(TestCase):
+    def test_bulk(self):
+        request = RequestFactory().get('/')
+        paths = ['/counted/a/', '/counted/b/', '/counted/no_memo/c/', '/books/1/raise_early_return/', '/books/2/raise_early_return/', '/does_not_exist/', '/books/', '/template_view']
+        self.assertEqual(bulk_test_page_visibility(request, paths), {
+            '/counted/a/': True,
+            '/counted/b/': True,
+            '/counted/no_memo/c/': True,
+            '/books/1/raise_early_return/': False,
+            '/books/2/raise_early_return/': False,
+            '/does_not_exist/': False,
+            # No get() handler
+            '/books/': False,
+            '/template_view': True,
+        })
+        self.assertEqual(request.counted_calls, 1)
+        # root preprocess is only called once
+        self.assertEqual(PreprocessCache.for_request(request).calls, 7)
+
 # TODO - test django_page_visibility support
\ No newline at end of file
@@ -0,0 +1,7 @@
+from django import http
+
+def preprocess(request, async_preprocessed, **kwargs):
+    return dict(sync_preprocessed=async_preprocessed)
+
+def get(request, root, async_preprocessed, sync_preprocessed):
+    return http.HttpResponse(f'sync:{root}:{sync_preprocessed}')
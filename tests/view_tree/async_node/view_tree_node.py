@@ -0,0 +1,10 @@
+from django import http
+
+async def preprocess(request, **kwargs):
+    return dict(async_preprocessed=True)
+
+async def get(request, root, async_preprocessed):
+    return http.HttpResponse(f'async:{root}:{async_preprocessed}')
+
+async def etag(request, **kwargs):
+    return 'async'
@@ -7,4 +7,7 @@ def get(request, root, book_id):
     return http.HttpResponse(f'root:{root}:book_id:{book_id}')
 
 def post(request, root, book_id):
-    return http.HttpResponse()
\ No newline at end of file
+    return http.HttpResponse()
+
+def enumerate_args():
+    yield from (1, 2)
@@ -0,0 +1,10 @@
+from django import http
+
+CACHE = {}
+
+calls = 0
+
+def get(request, **kwargs):
+    global calls
+    calls += 1
+    return http.HttpResponse(f'detail:{calls}')
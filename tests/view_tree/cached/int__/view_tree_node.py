@@ -0,0 +1,13 @@
+from django import http
+
+CACHE = {}
+
+calls = 0
+
+def get(request, book_id=None, **kwargs):
+    global calls
+    calls += 1
+    return http.HttpResponse(f'int:{calls}')
+
+def preprocess(request, book_id, **kwargs):
+    return dict(book_id=book_id)
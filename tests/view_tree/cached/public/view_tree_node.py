@@ -0,0 +1,16 @@
+from django import http
+
+CACHE = dict(public=True)
+
+calls = 0
+
+def get(request, **kwargs):
+    global calls
+    calls += 1
+    response = http.HttpResponse(f'public:{calls}')
+    if 'nocache' in request.GET :
+        response['Cache-Control'] = 'private'
+    return response
+
+def etag(request, **kwargs):
+    return 'public'
@@ -0,0 +1,26 @@
+from django import http
+from django.middleware.csrf import get_token
+from django_early_return import EarlyReturn
+
+CACHE = dict(timeout=60, vary=['query'])
+
+calls = 0
+
+def preprocess(request, **kwargs):
+    if 'X-Deny' in request.headers :
+        raise EarlyReturn(http.HttpResponseForbidden())
+
+def get(request, **kwargs):
+    global calls
+    calls += 1
+    response = http.HttpResponse(f'cached:{calls}')
+    if 'vary' in request.GET :
+        response['Vary'] = 'Accept-Language'
+    if 'csrf' in request.GET :
+        get_token(request)
+    if 'session' in request.GET :
+        request.session.get('theme')
+    return response
+
+def head(request, **kwargs):
+    return http.HttpResponse()
@@ -0,0 +1,12 @@
+from django import http
+
+from tests.view_tree.concurrent.view_tree_node import calls
+
+NEEDS = ('slow',)
+PRODUCES = ()
+
+def preprocess(request, slow, **kwargs):
+    calls.append('after')
+
+def get(request, **kwargs):
+    return http.HttpResponse()
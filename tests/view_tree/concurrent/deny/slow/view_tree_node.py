@@ -0,0 +1,9 @@
+from tests.view_tree.concurrent.view_tree_node import calls, release_slow
+
+NEEDS = ()
+PRODUCES = ('slow',)
+
+def preprocess(request, **kwargs):
+    release_slow.wait(5)
+    calls.append('slow')
+    return dict(slow=True)
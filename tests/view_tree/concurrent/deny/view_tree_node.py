@@ -0,0 +1,11 @@
+from django import http
+from django_early_return import EarlyReturn
+
+from tests.view_tree.concurrent.view_tree_node import calls
+
+NEEDS = ()
+PRODUCES = ()
+
+def preprocess(request, **kwargs):
+    calls.append('deny')
+    raise EarlyReturn(http.HttpResponseForbidden())
@@ -0,0 +1,17 @@
+import asyncio
+
+from django import http
+
+from tests.view_tree.concurrent.view_tree_node import barrier
+
+NEEDS = ('base',)
+PRODUCES = ('perms',)
+
+async def preprocess(request, base, **kwargs):
+    # flags isn't a dependency, so it's never passed
+    assert 'flags' not in kwargs
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    return dict(perms=base + ' perms')
+
+def get(request, base, flags, perms, **kwargs):
+    return http.HttpResponse(f'{base}:{flags}:{perms}')
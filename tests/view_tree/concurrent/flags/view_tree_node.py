@@ -0,0 +1,8 @@
+from tests.view_tree.concurrent.view_tree_node import barrier
+
+NEEDS = ()
+PRODUCES = ('flags',)
+
+def preprocess(request, **kwargs):
+    barrier.wait()
+    return dict(flags='flags')
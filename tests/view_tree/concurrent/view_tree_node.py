@@ -0,0 +1,12 @@
+import threading
+
+# Both declared steps below wait for each other, so they only complete if they run concurrently
+barrier = threading.Barrier(2, timeout=5)
+# deny/slow/ blocks until this is set
+release_slow = threading.Event()
+calls = []
+
+def preprocess(request, **kwargs):
+    # Undeclared, so this should run on the request's thread
+    request.base_thread = threading.current_thread().name
+    return dict(base='base')
@@ -0,0 +1,18 @@
+from datetime import datetime
+from django import http
+
+calls = 0
+
+def preprocess(request, **kwargs):
+    return dict(version=request.GET.get('version', '1'))
+
+def etag(request, version, **kwargs):
+    return f'v{version}'
+
+def last_modified(request, **kwargs):
+    return datetime(2020, 1, 1)
+
+def get(request, **kwargs):
+    global calls
+    calls += 1
+    return http.HttpResponse(f'conditional:{calls}')
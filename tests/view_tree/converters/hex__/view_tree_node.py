@@ -0,0 +1,7 @@
+from django import http
+
+def preprocess(request, value, **kwargs):
+    return dict(value=value)
+
+def get(request, value, **kwargs):
+    return http.HttpResponse(repr(value))
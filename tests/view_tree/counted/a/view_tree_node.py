@@ -0,0 +1,4 @@
+from django import http
+
+def get(request, **kwargs):
+    return http.HttpResponse()
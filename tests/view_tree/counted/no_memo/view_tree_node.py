@@ -0,0 +1,4 @@
+MEMOIZE_PREPROCESS = False
+
+def preprocess(request, **kwargs):
+    request.no_memo_calls = getattr(request, 'no_memo_calls', 0) + 1
@@ -0,0 +1,2 @@
+def preprocess(request, **kwargs):
+    request.counted_calls = getattr(request, 'counted_calls', 0) + 1
@@ -0,0 +1,4 @@
+from django import http
+
+def get(request, profile, settings, **kwargs):
+    return http.HttpResponse(f'{profile.name}:{profile.name}:{settings.name}')
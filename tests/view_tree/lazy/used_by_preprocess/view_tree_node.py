@@ -0,0 +1,7 @@
+from django import http
+
+def preprocess(request, profile, **kwargs):
+    return dict(title=profile.name.title())
+
+def get(request, title, **kwargs):
+    return http.HttpResponse(title)
@@ -0,0 +1,19 @@
+class Profile:
+    def __init__(self, name):
+        self.name = name
+
+def preprocess(request, **kwargs):
+    return dict(name='lazy')
+
+def get_profile(request, name, **kwargs):
+    request.profile_calls = getattr(request, 'profile_calls', 0) + 1
+    return Profile(name)
+
+def get_settings(request, profile, **kwargs):
+    request.settings_calls = getattr(request, 'settings_calls', 0) + 1
+    return Profile(profile.name + ' settings')
+
+PROVIDERS = {
+    'profile': get_profile,
+    'settings': get_settings,
+}
@@ -0,0 +1,10 @@
+from django import http
+from django.contrib.auth.models import Permission
+
+LOAD = dict(model=Permission, field='pk', parent='content_type')
+
+def preprocess(request, permission_id, permission, **kwargs):
+    return dict(codename=permission.codename)
+
+def get(request, content_type, codename, **kwargs):
+    return http.HttpResponse(f'{content_type.model}:{codename}')
@@ -0,0 +1 @@
+LOAD = dict(model='contenttypes.ContentType', name='content_type')
@@ -0,0 +1,7 @@
+from django import http
+
+# Note - Permission has an integer pk, so most strings can't match
+LOAD = dict(model='auth.Permission')
+
+def get(request, permission, **kwargs):
+    return http.HttpResponse(permission.codename)
@@ -0,0 +1,14 @@
+from django import http
+
+CSRF_EXEMPT = True
+
+PRELOAD = {
+    'preload/preload.css': 'style',
+    'preload/child.js': 'script',
+}
+
+def get(request, **kwargs):
+    return http.HttpResponse()
+
+def post(request, **kwargs):
+    return http.HttpResponse()
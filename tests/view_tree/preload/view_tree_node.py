@@ -0,0 +1,5 @@
+PRELOAD = {
+    'preload/preload.css': 'style',
+    '/fonts/serif.woff2': 'font',
+}
+PRECONNECT = ['https://cdn.example.com']
@@ -0,0 +1,3 @@
+async def get(request, **kwargs):
+    for i in range(3) :
+        yield str(i)
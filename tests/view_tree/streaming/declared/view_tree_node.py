@@ -0,0 +1,18 @@
+from django import http
+
+STREAMING = True
+handler_calls = 0
+iterations = 0
+
+def rows():
+    global iterations
+    iterations += 1
+    yield 'a'
+    yield 'b'
+
+def get(request, **kwargs):
+    global handler_calls
+    handler_calls += 1
+    if 'missing' in request.GET :
+        return http.HttpResponseNotFound()
+    return rows()
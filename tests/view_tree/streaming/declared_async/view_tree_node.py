@@ -0,0 +1,4 @@
+STREAMING = True
+
+async def get(request, **kwargs):
+    return iter(['a', 'b'])
@@ -0,0 +1,10 @@
+from django_tree_view import stream_node_template
+
+STREAMING_CONTENT_TYPE = 'text/csv'
+calls = 0
+
+def get(request, **kwargs):
+    global calls
+    calls += 1
+    yield 'n\n'
+    yield from stream_node_template(request, 'row.csv', [1, 2, 3], dict(suffix='!'), name='n')